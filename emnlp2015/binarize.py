@@ -4,25 +4,39 @@
 
 # perform deterministic head binarization of trees that were converted from dependency format (with mosesdecoder/scripts/training/wrappers/conll2mosesxml.py):
 # right-binarization of the head and its pre-modifiers, followed by left-binarization of all post-modifiers
+#
+# usage: binarize.py {head,left,right} [--lxml] [--jobs N] < in > out
+#
+# by default, lines are processed by a streaming parser that does not build a DOM; with --lxml, the original lxml-based implementation is used.
+# Both produce the same output.
+# with --jobs N, lines are processed by N worker processes, in blocks of about --block-bytes bytes (default: 1 MB);
+# the output is in the input order.
+# with --cache-size N or --cache-file PATH, results for duplicate lines are reused (see wmt14/cache.py).
 
 from __future__ import print_function, unicode_literals
 import sys
+import os
+import re
 import codecs
+from functools import partial
 from collections import defaultdict
 
-try:
-    from lxml import etree as ET
-except ImportError:
-    from xml.etree import cElementTree as ET
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import cache
+from wmt14 import profiling
+from wmt14.lazy import lazy_import
 
-def escape_xml(element):
+# only needed with --lxml
+ET = lazy_import('lxml.etree', 'xml.etree.cElementTree', 'xml.etree.ElementTree')
 
-    if element.text:
-        element.text = element.text.replace('\'','&apos;')
-        element.text = element.text.replace('"','&quot;')
+def escape_xml(element):
 
-    for child in element:
-        escape_xml(child)
+    for element in element.iter():
+        if element.text:
+            element.text = element.text.replace('\'','&apos;')
+            element.text = element.text.replace('"','&quot;')
 
 def escape_text(s):
 
@@ -36,68 +50,327 @@ def escape_text(s):
     return s
 
 # assume dependency structure where each nonterminal has exactly one pre-terminal child, which is the head of the structure.
-def find_head(xml):
-    for i, child in enumerate(xml):
-        if len(child) == 0:
+def find_head(children, is_leaf):
+    for i, child in enumerate(children):
+        if is_leaf(child):
             return i
     # if no head found, we pick the last child (which results in right-binarization of tree)
-    return len(xml)-1
+    return len(children)-1
 
-def binarize(xml, mode):
+def binarize_sequence(children, label, mode, is_leaf, make_node):
+    """binarize a list of children in a single pass, and return the new list of (at most two) children.
+    make_node(label, left, right) creates a virtual node, and is_leaf(child) is true for pre-terminals."""
 
-    for child in xml:
-        binarize(child, mode)
+    if len(children) <= 2:
+        return children
 
-    if len(xml) > 2 and mode == 'head':
-        head_position = find_head(xml)
+    if mode == 'head':
+        head_position = find_head(children, is_leaf)
         # right-binarize head position and everything before it
-        while head_position > 0 and len(xml) > 2:
-            head_position -= 1
-            virtual_node = ET.Element('tree')
-            if head_position > 0:
+        position = head_position
+        node = children[head_position]
+        length = len(children)
+        while position > 0 and length > 2:
+            position -= 1
+            if position > 0:
                 # prefix '^i' marks that we expect more siblings on the left (and possibly on the right)
-                virtual_node.set('label', '^i' + xml.get('label'))
+                node = make_node('^i' + label, children[position], node)
             else:
                 # prefix '^l' marks that we reached beginning of structure and have more siblings on the right
-                virtual_node.set('label', '^l' + xml.get('label'))
-            virtual_node.append(xml[head_position])
-            virtual_node.append(xml[head_position])
-            xml.insert(head_position, virtual_node)
+                node = make_node('^l' + label, children[position], node)
+            length -= 1
+        children = children[:position] + [node] + children[head_position+1:]
         # left-binarize the rest
-        while len(xml) > 2:
-            virtual_node = ET.Element('tree')
-            virtual_node.set('label', '^l' + xml.get('label'))
-            virtual_node.append(xml[0])
-            virtual_node.append(xml[0])
-            xml.insert(0, virtual_node)
+        if len(children) > 2:
+            node = children[0]
+            for child in children[1:-1]:
+                node = make_node('^l' + label, node, child)
+            children = [node, children[-1]]
+
+    elif mode == 'left':
+        node = children[0]
+        for child in children[1:-1]:
+            node = make_node('^' + label, node, child)
+        children = [node, children[-1]]
+
+    elif mode == 'right':
+        node = children[-1]
+        for child in reversed(children[1:-1]):
+            node = make_node('^' + label, child, node)
+        children = [children[0], node]
+
+    return children
+
+def is_leaf_element(element):
+    return len(element) == 0
+
+def make_tuple(label, left, right):
+    return (label, left, right)
+
+def binarize(xml, mode):
+
+    # reverse document order visits all children before their parent, so we don't need recursion
+    for element in reversed(list(xml.iter())):
+        children = list(element)
+        if len(children) > 2:
+            children = binarize_sequence(children, element.get('label'), mode, is_leaf_element, make_tuple)
+            del element[:]
+            # create virtual nodes top-down, so that each original child is only moved once
+            stack = [(element, child) for child in reversed(children)]
+            while stack:
+                parent, child = stack.pop()
+                if isinstance(child, tuple):
+                    label, left, right = child
+                    virtual_node = ET.SubElement(parent, 'tree')
+                    virtual_node.set('label', label)
+                    stack.append((virtual_node, right))
+                    stack.append((virtual_node, left))
+                else:
+                    parent.append(child)
+
+
+# streaming binarization: split Moses XML lines into tags and text with a regular expression, and build a lightweight tree with a stack.
+# Escaping is done in a single pass, and produces the same output as escape_xml(), serialization with lxml, and escape_text().
+
+re_markup = re.compile(r'(<[^<>"\']*(?:(?:"[^"<]*"|\'[^\'<]*\')[^<>"\']*)*>)')
+re_open_tag = re.compile(r'<([^\s/<>!?]+)((?:\s+[^\s=<>]+\s*=\s*(?:"[^"<]*"|\'[^\'<]*\'))*)\s*(/?)>$')
+re_attribute = re.compile(r'([^\s=]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+re_entity = re.compile(r'&(?:#([0-9]+)|#x([0-9a-fA-F]+)|(amp|lt|gt|quot|apos));')
+re_attribute_whitespace = re.compile(r'[\t\n\r]')
+
+ENTITIES = {'amp': '&', 'lt': '<', 'gt': '>', 'quot': '"', 'apos': "'"}
+
+ESCAPES = {'&apos;': '&apos;',
+           '&quot;': '&quot;',
+           '&': '&amp;',
+           '<': '&lt;',
+           '>': '&gt;',
+           "'": '&apos;',
+           '"': '&quot;',
+           '|': '&#124;',
+           '[': '&#91;',
+           ']': '&#93;',
+           '\t': '&#9;',
+           '\n': '&#10;',
+           '\r': '&#13;'}
+
+# element text (escaped by escape_xml), element tail, and attribute values are escaped differently
+re_escape_text = re.compile(r'&apos;|&quot;|[&<>\'"|\[\]\r]')
+re_escape_tail = re.compile(r'&apos;|&quot;|[&<>|\[\]\r]')
+re_escape_attribute = re.compile(r'&apos;|&quot;|[&<>"|\[\]\t\n\r]')
+
+# raw text that contains none of these characters is written unchanged
+re_special_text = re.compile(r'[&<>\'"|\[\]\r]')
+re_special_tail = re.compile(r'[&<>|\[\]\r]')
+
+try:
+    unichr
+except NameError:
+    unichr = chr
+
+def unescape_entity(match):
+    if match.group(1):
+        return unichr(int(match.group(1)))
+    elif match.group(2):
+        return unichr(int(match.group(2), 16))
+    return ENTITIES[match.group(3)]
+
+def unescape(s):
+    if '&' in s:
+        if '&' in re_entity.sub('', s):
+            raise ValueError('unknown entity or unescaped "&" in line')
+        s = re_entity.sub(unescape_entity, s)
+    return s
+
+def replace_escape(match):
+    return ESCAPES[match.group()]
+
+def escape_text_stream(s):
+    if re_special_text.search(s):
+        return re_escape_text.sub(replace_escape, unescape(s))
+    return s
+
+def escape_tail_stream(s):
+    if re_special_tail.search(s):
+        return re_escape_tail.sub(replace_escape, unescape(s))
+    return s
+
+
+# nodes of the lightweight tree are lists with the following fields
+TAG, ATTRIBUTES, LABEL, TEXT, CHILDREN, TAIL = range(6)
+
+open_tag_cache = {}
+OPEN_TAG_CACHE_SIZE = 10000
+
+def parse_open_tag(markup):
+    """return tag name, serialized attributes, escaped label, and whether the element is empty"""
+    try:
+        return open_tag_cache[markup]
+    except KeyError:
+        pass
+
+    match = re_open_tag.match(markup)
+    if not match:
+        raise ValueError('unsupported markup: {0}'.format(markup))
+    tag, attributes, empty = match.groups()
+
+    serialized = []
+    label = None
+    for name, value1, value2 in re_attribute.findall(attributes):
+        value = unescape(re_attribute_whitespace.sub(' ', value1 or value2))
+        value = re_escape_attribute.sub(replace_escape, value)
+        serialized.append(' ' + name + '="' + value + '"')
+        if name == 'label':
+            label = value
+
+    result = tag, ''.join(serialized), label, bool(empty)
+    if len(open_tag_cache) >= OPEN_TAG_CACHE_SIZE:
+        open_tag_cache.clear()
+    open_tag_cache[markup] = result
+    return result
+
 
+def parse_stream(line, mode=None):
+    """parse a line in Moses XML format into a tree of lightweight nodes; text is escaped for output.
+    If mode is given, each node is binarized as soon as it is complete (its children are already binarized at this point)."""
+
+    pieces = re_markup.split(line)
+    # pieces alternate between text and markup; like lxml, ignore whitespace outside of the root element
+    if pieces[0].strip() or pieces[-1].strip():
+        raise ValueError('text outside of root element')
+
+    root = None
+    stack = []
+    for i in range(1, len(pieces), 2):
+        markup = pieces[i]
+        text = pieces[i+1]
+        if '<' in text:
+            raise ValueError('invalid markup in line')
+
+        if markup[1] == '/':
+            node = stack.pop() if stack else None
+            if node is None or markup[2:-1].rstrip() != node[TAG]:
+                raise ValueError('mismatched closing tag {0}'.format(markup))
+            if mode:
+                binarize_children(node, mode)
+            if text:
+                if not stack:
+                    # whitespace after root element (checked above)
+                    continue
+                node[TAIL] = escape_tail_stream(text)
+            continue
+
+        if root is not None and not stack:
+            raise ValueError('more than one root element')
+
+        tag, attributes, label, empty = parse_open_tag(markup)
+        node = [tag, attributes, label, '', [], '']
+        if stack:
+            stack[-1][CHILDREN].append(node)
+        else:
+            root = node
+
+        if empty:
+            if text and stack:
+                node[TAIL] = escape_tail_stream(text)
+        else:
+            stack.append(node)
+            if text:
+                node[TEXT] = escape_text_stream(text)
+
+    if root is None or stack:
+        raise ValueError('incomplete XML line')
+
+    return root
+
+
+def is_leaf_node(node):
+    return not node[CHILDREN]
+
+def make_virtual_node(label, left, right):
+    return ['tree', ' label="' + label + '"', label, '', [left, right], '']
+
+def binarize_children(node, mode):
+    """binarize the children of a single node"""
+    node[CHILDREN] = binarize_sequence(node[CHILDREN], node[LABEL], mode, is_leaf_node, make_virtual_node)
+
+
+def serialize_stream(root):
+    """serialize a tree of lightweight nodes"""
+
+    out = []
+    # stack of nodes to write, or closing tags
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.__class__ is not list:
+            out.append(node)
+        elif node[CHILDREN]:
+            out.append('<' + node[TAG] + node[ATTRIBUTES] + '>' + node[TEXT])
+            stack.append('</' + node[TAG] + '>' + node[TAIL])
+            stack.extend(reversed(node[CHILDREN]))
+        elif node[TEXT]:
+            out.append('<' + node[TAG] + node[ATTRIBUTES] + '>' + node[TEXT] + '</' + node[TAG] + '>' + node[TAIL])
+        else:
+            out.append('<' + node[TAG] + node[ATTRIBUTES] + '/>' + node[TAIL])
+    return ''.join(out)
+
+
+def binarize_stream(line, mode):
+    """binarize a line in Moses XML format without building a DOM; nodes are binarized when their closing tag is read,
+    so the tree is binarized bottom-up without recursion."""
+
+    return serialize_stream(parse_stream(line, mode))
+
+
+def binarize_line(line, mode, use_lxml=False):
+    """binarize a line in Moses XML format, and return the output line"""
+    if line == '\n':
+        return line
+    if use_lxml:
+        xml = ET.fromstring(line)
+        binarize(xml, mode)
+        escape_xml(xml)
+        return escape_text(ET.tostring(xml, encoding="UTF-8").decode("UTF-8") + '\n')
     else:
-        while len(xml) > 2:
-            virtual_node = ET.Element('tree')
-            virtual_node.set('label', '^' + xml.get('label'))
-            if mode == 'left':
-                virtual_node.append(xml[0])
-                virtual_node.append(xml[0])
-                xml.insert(0, virtual_node)
-            elif mode == 'right':
-                virtual_node.append(xml[-2])
-                virtual_node.append(xml[-1])
-                xml.append(virtual_node)
+        return binarize_stream(line, mode) + '\n'
+
+
+def binarize_block(lines, mode, use_lxml=False):
+    return [binarize_line(line, mode, use_lxml) for line in lines]
+
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('parse', parse_stream)
+profiling.register('serialize', serialize_stream)
+
 
 if __name__ == '__main__':
 
+    profiling.start_from_environment()
+
+    input_path, output_path = fileio.pop_io_arguments(sys.argv)
+    jobs, block_bytes = parallel.pop_parallel_arguments(sys.argv)
+    cache_size, cache_file = cache.pop_cache_arguments(sys.argv)
+    sys.stdin = fileio.open_input(input_path, 'UTF-8')
+    sys.stdout = fileio.open_output(output_path, 'UTF-8')
+
     if sys.version_info < (3, 0):
         sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
-        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-        sys.stdin = codecs.getreader('UTF-8')(sys.stdin)
 
     mode = sys.argv[1]
+    use_lxml = '--lxml' in sys.argv[2:]
 
-    for line in sys.stdin:
-        if line == '\n':
-            sys.stdout.write(line)
-            continue
-        xml = ET.fromstring(line)
-        binarize(xml, mode)
-        escape_xml(xml)
-        sys.stdout.write(escape_text(ET.tostring(xml, encoding="UTF-8").decode("UTF-8") + '\n'))
\ No newline at end of file
+    # --lxml produces the same output, and is not part of the cache key
+    line_cache = cache.create('binarize', mode, cache_size, cache_file)
+
+    if jobs > 1 or line_cache is not None:
+        function = partial(binarize_block, mode=mode, use_lxml=use_lxml)
+        for output in parallel.map_units(function, sys.stdin, jobs, block_bytes, line_cache):
+            sys.stdout.write(output)
+        if line_cache is not None:
+            line_cache.close()
+            line_cache.report()
+    else:
+        for line in sys.stdin:
+            sys.stdout.write(binarize_line(line, mode, use_lxml))
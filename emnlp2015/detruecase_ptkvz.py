@@ -0,0 +1,116 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# post-process the tree output of the Moses decoder (produced with -Ttree) in a single process:
+# extract the full tree of each sentence, remove virtual nodes introduced by binarization (unbinarize.py),
+# restore the original representation of particle verbs (separable_prefix_postprocessing.py),
+# and merge split compounds (the regular expressions of the detokenizer in the example configs).
+#
+# this replaces the following pipeline (detruecase_ptkvz.sh):
+#
+#   grep "Full Tree" TREE_FILE | cut -f 2- -d ":" | cut -f "2-" -d " " | unbinarize.py | separable_prefix_postprocessing.py
+#
+# usage: detruecase_ptkvz.py [--tree] [--no-merge] [--nbest] [--output PATH] [TREE_FILE]
+#
+# with --tree, trees are written instead of strings (and compounds are not merged).
+# with --no-merge, compounds are not merged, and the output is the same as that of detruecase_ptkvz.sh.
+# output is in the order of the sentence IDs; if TREE_FILE is not given, it is read from standard input.
+# with --nbest, the input is a Moses n-best list with trees as hypotheses, and only the hypotheses are rewritten.
+
+from __future__ import unicode_literals
+import sys
+import os
+import re
+
+import nbest
+import unbinarize
+import separable_prefix_postprocessing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import profiling
+
+re_sentence_id = re.compile(br'Full Tree (\d+):')
+
+# compound merging, as in the detokenizer of the example configs: s/ \@(\S*?)\@ /\1/g; s/\@\@ //g
+re_compound_filler = re.compile(br' @(\S*?)@ ')
+compound_juncture = b'@@ '
+
+def read_trees(file_obj):
+    """yield (sentence ID, tree string) for each full tree in the decoder tree output.
+    If a line has no ID, the sentence number is used."""
+
+    sentence = 0
+    for line in file_obj:
+        if b'Full Tree' not in line:
+            continue
+        match = re_sentence_id.search(line)
+        if match:
+            sentence = int(match.group(1))
+        # same as cut -f 2- -d ":" | cut -f "2-" -d " " (lines without the delimiter are kept as they are)
+        tree_string = line.rstrip(b'\r\n')
+        for delimiter in b':', b' ':
+            if delimiter in tree_string:
+                tree_string = tree_string.split(delimiter, 1)[1]
+        yield sentence, tree_string
+        sentence += 1
+
+
+def in_order(items):
+    """yield items (pairs of sentence ID and value) in the order of their IDs, starting from 0.
+    Items that arrive early are kept until all items with smaller IDs have been written;
+    if some IDs are missing, the remaining items are written at the end."""
+
+    pending = {}
+    expected = 0
+    for sentence, value in items:
+        pending.setdefault(sentence, []).append(value)
+        while expected in pending:
+            for value in pending.pop(expected):
+                yield value
+            expected += 1
+    for sentence in sorted(pending):
+        for value in pending[sentence]:
+            yield value
+
+
+def merge_compounds(line):
+    line = re_compound_filler.sub(br'\1', line)
+    return line.replace(compound_juncture, b'')
+
+
+def postprocess(tree_string, write_tree=False, merge=True):
+    """unbinarize a tree string, restore particle verbs, and return the tree or its (compound-merged) string"""
+
+    line = separable_prefix_postprocessing.restore_ptkvz(unbinarize.unbinarize_string(tree_string), write_tree)
+    if merge and not write_tree:
+        line = merge_compounds(line)
+    return line
+
+
+def main(file_obj, out_obj, write_tree=False, merge=True, nbest_list=False):
+
+    if nbest_list:
+        nbest.process_nbest(file_obj, out_obj, lambda tree_string: postprocess(tree_string, write_tree, merge))
+        return
+
+    for tree_string in in_order(read_trees(file_obj)):
+        out_obj.write(postprocess(tree_string, write_tree, merge) + b'\n')
+
+
+if __name__ == '__main__':
+
+    profiling.start_from_environment()
+
+    input_path, output_path = fileio.pop_io_arguments(sys.argv)
+
+    write_tree = '--tree' in sys.argv
+    merge = '--no-merge' not in sys.argv
+    nbest_list = '--nbest' in sys.argv
+    files = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+
+    if files:
+        input_path = files[0]
+
+    main(fileio.open_input(input_path), fileio.open_output(output_path), write_tree, merge, nbest_list)
@@ -2,10 +2,9 @@
 
 # EMS hack: do post-processing of particle verbs in detruecase step;
 # instead of string translation output, we need tree output that we take from -Ttree file.
+# (all post-processing is done in a single process by detruecase_ptkvz.py; compounds are merged later by the detokenizer)
 
 script_dir=$1
 shift
 
-grep "Full Tree" $1 | cut -f 2- -d ":" | cut -f "2-" -d " " | \
-python3 $script_dir/emnlp2015/unbinarize.py | \
-python $script_dir/emnlp2015/separable_prefix_postprocessing.py
+python $script_dir/emnlp2015/detruecase_ptkvz.py --no-merge $1
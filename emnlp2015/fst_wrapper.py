@@ -4,65 +4,152 @@
 
 from __future__ import unicode_literals, print_function
 import sys
+import os
 import re
-import pexpect
+import time
+from collections import deque
+
+# imported when the first fst-mor process is started
+pexpect = None
+
+TIMEOUT = 30 # seconds to wait for the analysis of a word before fst-mor is restarted and the word is quarantined
+MAX_RESTARTS = 5 # give up if fst-mor fails this many times in a row
+RESTART_DELAY = 1 # seconds before the first restart of fst-mor; doubled with each consecutive failure
+LATENCY_SAMPLES = 1000 # number of recent response times of fst-mor that are kept (for progress reports)
 
 
 class FstWrapper():
-    def __init__(self, smor_binary, smor_model):
-        self.child = pexpect.spawnu(smor_binary + ' ' + smor_model)
+    def __init__(self, smor_binary, smor_model, server=None, timeout=TIMEOUT, max_restarts=MAX_RESTARTS):
+        # attach to a shared analysis server (smor_server.py) if its socket is given, or set in the environment variable SMOR_SERVER.
+        # server='' always starts a new fst-mor process.
+        if server is None:
+            server = os.environ.get('SMOR_SERVER')
+        if server:
+            sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            import smor_server
+            self.server = smor_server.SmorClient(server, smor_model)
+            return
+        self.server = None
+
+        global pexpect
+        import pexpect
+        self.command = smor_binary + ' ' + smor_model
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        # words that made fst-mor hang or crash; they are not sent to fst-mor again, and have no analysis
+        self.quarantine = set()
+        self.restarts = 0
+        self.failures = 0 # consecutive failures since the last successful query
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.start()
+
+    def start(self):
+        self.child = pexpect.spawnu(self.command)
         self.child.delaybeforesend = 0
-        self.child.expect(["analyze> ", pexpect.EOF], timeout=600)
+        index = self.child.expect(["analyze> ", pexpect.EOF], timeout=600)
         self.morAnalyseMode = True
         before = self.child.before
-        if self.child.terminated:
+        if index == 1 or not self.child.isalive():
             raise RuntimeError(before)
 
-    def analyse(self, word):
-        word = word.strip()
-        if word == "" or word == "q" or word == "\x7f":
-            return []
-        # if not in analyse mode, go to it
-        if self.morAnalyseMode == False: 
-            # print "Was not in analyse mode => toggle to it!"
-            self.toggleMorMode()
-            self.child.sendline("") # "" is used in the fst-mor to toggle between analyse/generate
-            self.child.expect(["analyze> ", pexpect.EOF])
-            self.child.before
-        self.child.sendline(word)
+    def restart(self, reason):
+        """kill fst-mor and start a new process (in analyse mode). The delay before each attempt doubles with the number
+        of consecutive failures; give up after max_restarts failures in a row."""
+        while True:
+            self.failures += 1
+            if self.failures > self.max_restarts:
+                raise RuntimeError('fst-mor failed {0} times in a row ({1})'.format(self.failures, reason))
+            sys.stderr.write('Warning: {0}; restarting fst-mor\n'.format(reason))
+            try:
+                self.child.close(force=True)
+            except Exception:
+                pass
+            time.sleep(RESTART_DELAY * 2**(self.failures-1))
+            try:
+                self.start()
+            except (RuntimeError, pexpect.ExceptionPexpect) as e:
+                reason = 'fst-mor could not be started: {0}'.format(e)
+                continue
+            self.restarts += 1
+            return
+
+    def send(self, line, prompt):
+        """send a line to fst-mor and return its output, or None if fst-mor terminated. Raises pexpect.TIMEOUT."""
+        start = time.time()
         try:
-            self.child.expect(["analyze> ", pexpect.EOF])
-        except pexpect.TIMEOUT:
-            sys.stderr.write('Warning: timeout while waiting for fst-mor\n')
-            sys.stderr.write('String: {0}'.format(word))
+            self.child.sendline(line)
+        except OSError:
+            return None
+        if self.child.expect([prompt, pexpect.EOF], timeout=self.timeout) == 1:
+            return None
+        self.latencies.append(time.time() - start)
+        return self.child.before
+
+    def set_mode(self, analyse, prompt):
+        """go to analyse or generate mode. If fst-mor dies or does not answer in time, it is restarted (in analyse mode);
+        no word is quarantined."""
+        while self.morAnalyseMode != analyse:
+            self.toggleMorMode()
+            try:
+                # "" is used in the fst-mor to toggle between analyse/generate
+                if self.send("", prompt) is not None:
+                    return
+                reason = 'fst-mor terminated while changing mode'
+            except pexpect.TIMEOUT:
+                reason = 'timeout after {0} seconds while changing mode'.format(self.timeout)
+            self.restart(reason)
+
+    def query(self, word, analyse):
+        """analyse or generate a word. If fst-mor dies, the word is retried once with a new process;
+        if it dies again, or does not answer in time, the word is quarantined."""
+        if word in self.quarantine:
             return []
-        result = self.child.before.split("\r\n")[1:-1]
+        if analyse:
+            prompt = "analyze> "
+        else:
+            prompt = "generate> "
+        for attempt in range(2):
+            self.set_mode(analyse, prompt)
+            try:
+                output = self.send(word, prompt)
+            except pexpect.TIMEOUT:
+                self.quarantine.add(word)
+                self.restart('timeout after {0} seconds while processing {1}; word quarantined'.format(self.timeout, word))
+                return []
+            if output is not None:
+                break
+            self.restart('fst-mor terminated while processing {0}'.format(word))
+        else:
+            sys.stderr.write('Warning: fst-mor terminated twice while processing {0}; word quarantined\n'.format(word))
+            self.quarantine.add(word)
+            return []
+        self.failures = 0
+        result = output.split("\r\n")[1:-1]
         if len(result) == 1 and re.match("^no result for ", result[0]):
             result = []
         return result
 
+    def analyse(self, word):
+        if self.server is not None:
+            return self.server.analyse(word)
+        word = word.strip()
+        if word == "" or word == "q" or word == "\x7f":
+            return []
+        return self.query(word, True)
+
+    def analyse_batch(self, words):
+        """analyse a list of words; with a server, this is a single request"""
+        if self.server is not None:
+            return self.server.analyse_batch(words)
+        return [self.analyse(word) for word in words]
+
     def generate(self, word):
+        if self.server is not None:
+            return self.server.generate(word)
         word = word.strip()
         if word == "" or word == "q":
             return []
-        # if not in analyse mode, go to it
-        if self.morAnalyseMode == True: 
-            # print "Was not in generate mode => toggle to it!"
-            self.toggleMorMode()
-            self.child.sendline("") # "" is used in the fst-mor to toggle between analyse/generate
-            self.child.expect(["generate> ", pexpect.EOF])
-            self.child.before
-        self.child.sendline(word)
-        try:
-            self.child.expect(["generate> ", pexpect.EOF])
-        except pexpect.TIMEOUT:
-            sys.stderr.write('Warning: timeout while waiting for fst-mor\n')
-            sys.stderr.write('String: {0}'.format(word))
-            return []
-        result = self.child.before.split("\r\n")[1:-1]
-        if len(result) == 1 and re.match("^no result for ", result[0]):
-            result = []
-        return result
+        return self.query(word, False)
 
     # if you just want to play around you can use this function
     def openShell(self):
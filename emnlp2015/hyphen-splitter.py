@@ -3,14 +3,40 @@
 # Author: Rico Sennrich
 
 # hyphen splitter: splits all hyphenated words, and with option -syntax, creates a hierarchical tree in moses XML format.
+# the output for each word form is cached, since the same hyphenated words recur across the corpus.
+# with --jobs N, lines are processed by N worker processes, in blocks of about --block-bytes bytes (default: 1 MB);
+# the output is in the input order.
+# with --cache-size N or --cache-file PATH, results for duplicate lines are reused (see wmt14/cache.py).
 
 from __future__ import division, unicode_literals
 import sys
+import os
 import re
 import codecs
 import argparse
+from functools import partial
 
-from lxml import etree as ET
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import cache
+from wmt14 import profiling
+from wmt14.lazy import lazy_import
+
+# only needed for -syntax
+ET = lazy_import('lxml.etree')
+
+CACHE_SIZE = 100000
+
+# cache of word form (and options) -> (output, whether a compound tree was created)
+render_cache = {}
+
+# characters that lxml does not accept in text; words with these characters are rendered with lxml (which raises an error)
+re_xml_invalid = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def escape_text(text):
+    """escape text like lxml does in element content"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
 def create_compound_xml(element, wordlist, merge_junctures, dependency, initial=False):
 
@@ -55,52 +81,118 @@ def create_compound_xml(element, wordlist, merge_junctures, dependency, initial=
     head.append(dep3)
 
 
-def main(file_obj, merge_junctures, syntax, dependency):
+def create_compound_markup(wordlist, merge_junctures, initial=False):
+    """same as create_compound_xml(), but return the serialized children as a string, without lxml"""
 
-    re_syntax_splitter = re.compile(r'((?:\s*(?:<[^<>]*>)+\s*)|(?:(?<!>)\s+(?!<)))')
-    re_hyphen_splitter = re.compile(r'(\S+?)\-(?=\S)')
+    # separate last segment, then recursively label remainder as compound modifier
+    if initial:
+        dep = '<tree label="SEGMENT">' + escape_text(wordlist[-1]) + '</tree>'
+        remainder = wordlist[:-1]
+        if remainder:
+            return create_compound_markup(remainder, merge_junctures) + dep
+        return dep
 
-    for line in file_obj:
+    juncture = wordlist[-1]
+    word = wordlist[-2]
+    remainder = wordlist[:-2]
 
-        # only do syntactic processing if option syntax is used and we see '<' in line
-        write_syntax = syntax
-        if write_syntax and not '<' in line:
-            write_syntax = False
+    if merge_junctures:
+        label = 'SEGMENT+JUNC'
+    else:
+        label = 'SEGMENT'
+
+    markup = ['<tree label="comp_mod">']
+    if remainder:
+        markup.append(create_compound_markup(remainder, merge_junctures))
+    markup.append('<tree label="{0}">{1}</tree>'.format(label, escape_text(word)))
+    markup.append('<tree label="junc"><tree label="JUNC">{0}</tree></tree>'.format(escape_text(juncture)))
+    markup.append('</tree>')
+    return ''.join(markup)
+
+
+re_syntax_splitter = re.compile(r'((?:\s*(?:<[^<>]*>)+\s*)|(?:(?<!>)\s+(?!<)))')
+re_hyphen_splitter = re.compile(r'(\S+?)\-(?=\S)')
 
-        if write_syntax:
-            words_in = re_syntax_splitter.split(line)
-            words_in_clean = [word for word in words_in if word and not word.startswith('<') and not word == ' ']
+
+def render_word(word, merge_junctures, syntax, dependency):
+    """split a hyphenated word, and return the output string, and whether it is a compound tree
+    (in which case the closing tag of the preceding preterminal must be removed)"""
+
+    if merge_junctures:
+        word = re_hyphen_splitter.sub(r'\1-@@ ', word)
+    else:
+        word = re_hyphen_splitter.sub(r'\1 @-@ ', word)
+
+    if syntax and len(word.split()) > 1:
+        if re_xml_invalid.search(word):
+            head = ET.Element('x')
+            create_compound_xml(head, word.split(), merge_junctures, dependency, initial=True)
+            word = ET.tostring(head, encoding="UTF-8")[3:-4].decode("UTF-8")
         else:
-            words_in = line.split()
-            words_in_clean = words_in
-
-        words = []
-        for word in words_in:
-
-            if not word:
-                continue
-            if word == ' ' or (write_syntax and word.startswith('<')) or word == '@-@':
-                words.append(word)
-                continue
-
-            if merge_junctures:
-                word = re_hyphen_splitter.sub(r'\1-@@ ', word)
-            else:
-                word = re_hyphen_splitter.sub(r'\1 @-@ ', word)
-
-            if write_syntax and len(word.split()) > 1:
-                head = ET.Element('x')
-                create_compound_xml(head, word.split(), merge_junctures, dependency, initial=True)
-                word = ET.tostring(head, encoding="UTF-8")[3:-4].decode("UTF-8")
-                word = word.rsplit('<',1)[0]
-                words[-1] = words[-1].rsplit('<',1)[0]
+            word = create_compound_markup(word.split(), merge_junctures, initial=True)
+        return word.rsplit('<',1)[0], True
+
+    return word, False
 
+
+def split_hyphens(line, merge_junctures, syntax, dependency):
+    """split the hyphenated words in one line of input, and return the output line"""
+
+    # only do syntactic processing if option syntax is used and we see '<' in line
+    write_syntax = syntax
+    if write_syntax and not '<' in line:
+        write_syntax = False
+
+    if write_syntax:
+        words_in = re_syntax_splitter.split(line)
+        words_in_clean = [word for word in words_in if word and not word.startswith('<') and not word == ' ']
+    else:
+        words_in = line.split()
+        words_in_clean = words_in
+
+    words = []
+    for word in words_in:
+
+        if not word:
+            continue
+        if word == ' ' or (write_syntax and word.startswith('<')) or word == '@-@':
             words.append(word)
+            continue
 
-        if write_syntax:
-            sys.stdout.write(''.join(words))
-        else:
-            sys.stdout.write(' '.join(words) + '\n')
+        key = (word, merge_junctures, write_syntax, dependency)
+        rendered = render_cache.get(key)
+        if rendered is None:
+            rendered = render_word(word, merge_junctures, write_syntax, dependency)
+            if len(render_cache) >= CACHE_SIZE:
+                render_cache.clear()
+            render_cache[key] = rendered
+        word, compound = rendered
+
+        if compound:
+            words[-1] = words[-1].rsplit('<',1)[0]
+
+        words.append(word)
+
+    if write_syntax:
+        return ''.join(words)
+    else:
+        return ' '.join(words) + '\n'
+
+
+def split_block(lines, merge_junctures, syntax, dependency):
+    return [split_hyphens(line, merge_junctures, syntax, dependency) for line in lines]
+
+
+def main(file_obj, merge_junctures, syntax, dependency, jobs=1, block_bytes=parallel.BLOCK_BYTES, line_cache=None):
+
+    if jobs > 1 or line_cache is not None:
+        function = partial(split_block, merge_junctures=merge_junctures, syntax=syntax, dependency=dependency)
+        for output in parallel.map_units(function, file_obj, jobs, block_bytes, line_cache):
+            sys.stdout.write(output)
+        return
+
+    for line in file_obj:
+        sys.stdout.write(split_hyphens(line, merge_junctures, syntax, dependency))
 
 
 def parse_arguments():
@@ -113,8 +205,10 @@ def parse_arguments():
 
     general.add_argument('-model', metavar='MODEL',
                     help='path to statistical model. Currently ignored.')
-    general.add_argument('-corpus', type=argparse.FileType('r'), default=sys.stdin, metavar='PATH',
-                    help='input text (default: standard input).')
+    general.add_argument('-corpus', metavar='PATH',
+                    help='input text (default: standard input). May be compressed (gzip, xz, zstd).')
+    general.add_argument('-output', metavar='PATH',
+                    help='output text (default: standard output). Compressed if PATH ends in .gz, .xz or .zst.')
     general.add_argument('-train', action="store_true",
                     help='train model on input text. Currently ignored.')
     general.add_argument('-syntax', action="store_true",
@@ -127,23 +221,45 @@ def parse_arguments():
     general.add_argument('-merge-filler', action="store_true", dest='merge_junctures',
                     help='concatenate hyphens with preceding word ("Test-@@ Datei" instead of "Test @-@ Datei")')
 
+    general.add_argument('--jobs', type=int, default=1, metavar='N',
+                    help='number of worker processes (default: %(default)s)')
+    general.add_argument('--block-bytes', type=int, default=parallel.BLOCK_BYTES, metavar='BYTES',
+                    help='size of the blocks of input that are sent to the workers (default: %(default)s)')
+
+    general.add_argument('--cache-size', type=int, metavar='N',
+                    help='number of results for distinct lines that are kept in memory (default: {0} with --cache-file, otherwise no cache)'.format(cache.CACHE_SIZE))
+    general.add_argument('--cache-file', metavar='PATH',
+                    help='SQLite database in which results are kept across runs')
+
     args = parser.parse_args()
 
     return args
 
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('serialize', render_word)
+
+
 if __name__ == '__main__':
 
+    profiling.start_from_environment()
+
     args = parse_arguments()
 
     VERBOSE = not args.q
 
     if sys.version_info < (3, 0):
-        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-        args.corpus = codecs.getreader('UTF-8')(args.corpus)
         sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
 
     if args.train:
         sys.exit(0)
 
     else:
-        main(args.corpus, args.merge_junctures, args.syntax, args.dependency)
+        args.corpus = fileio.open_input(args.corpus, 'UTF-8')
+        sys.stdout = fileio.open_output(args.output, 'UTF-8')
+        options = 'merge={0} syntax={1} dependency={2}'.format(args.merge_junctures, args.syntax, args.dependency)
+        line_cache = cache.create('hyphen', options, args.cache_size, args.cache_file)
+        main(args.corpus, args.merge_junctures, args.syntax, args.dependency, args.jobs, args.block_bytes, line_cache)
+        if line_cache is not None:
+            line_cache.close()
+            line_cache.report()
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# helper for processing Moses n-best lists (id ||| hypothesis ||| features ||| score) whose hypotheses are trees:
+# only the hypothesis field is rewritten, and the result for each distinct tree is computed once per sentence ID.
+
+from __future__ import unicode_literals
+
+
+def process_nbest(file_obj, out_obj, function):
+    """apply function to the hypothesis field of each line of an n-best list, and write the result to out_obj.
+    Lines can be text or byte strings; function gets and returns the same type."""
+
+    for line in map_nbest(file_obj, function):
+        out_obj.write(line)
+
+
+def map_nbest(file_obj, function):
+    """like process_nbest(), but yield the output lines"""
+
+    cache = {}
+    sentence = None
+
+    for line in file_obj:
+        if isinstance(line, bytes):
+            separator = b' ||| '
+        else:
+            separator = ' ||| '
+
+        fields = line.split(separator)
+        if len(fields) < 3:
+            yield line
+            continue
+
+        # hypotheses of different sentences rarely share a tree; keep the cache small
+        if fields[0] != sentence:
+            cache.clear()
+            sentence = fields[0]
+
+        hypothesis = fields[1]
+        result = cache.get(hypothesis)
+        if result is None:
+            result = cache[hypothesis] = function(hypothesis)
+        fields[1] = result
+
+        yield separator.join(fields)
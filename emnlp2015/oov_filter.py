@@ -2,27 +2,209 @@
 # the provided vocabulary file
 
 # usage: python oov_filter.py vocabulary_file < phrase_table_in > phrase_table_out
+#
+# with --jobs N and --table PATH, the (uncompressed) table is memory-mapped, split into chunks of lines,
+# and filtered by N worker processes; the output is in the original order.
+# discarded lines are written to the file 'discarded', or to the path given with --discarded.
+#
+# with --test-set PATH (the tokenized source side of the test set, one sentence per line, escaped like the table),
+# rules are also discarded if a sequence of source-side terminals (between non-terminals) does not occur in the test set.
+#
+# all input files may be compressed (gzip, xz, zstd); the output (--output) and the discarded lines are compressed
+# if the path ends in .gz, .xz or .zst. A compressed table cannot be memory-mapped, and is filtered in a single process.
 
+from __future__ import print_function
 import sys
+import os
+import io
+import mmap
+import argparse
 
-vocab = open(sys.argv[1]).readlines()
-vocab = set([item.strip() for item in vocab])
-
-discarded = open('discarded','w')
-
-count = 0
-dcount = 0
-for line in sys.stdin:
-    count += 1
-    linesplit = line.split('|||')
-    for word in linesplit[1].split()[:-1]:
-      if word.startswith('['):
-        continue
-      elif word not in vocab:
-        discarded.write(line)
-        dcount += 1
-        break
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import profiling
+
+CHUNK_SIZE = 16*1024*1024
+MAX_NGRAM = 10
+
+# set in each worker process by init_worker()
+worker_vocab = None
+worker_table = None
+worker_ngrams = None
+worker_max_ngram = MAX_NGRAM
+
+
+def has_oov(line, vocab):
+    """check if the target side of a rule has a terminal that is not in the vocabulary"""
+    for word in line.split(b'|||')[1].split()[:-1]:
+        if word.startswith(b'['):
+            continue
+        elif word not in vocab:
+            return True
+    return False
+
+
+def index_ngrams(file_obj, max_ngram):
+    """return the set of all n-grams (up to length max_ngram) in a text, as byte strings"""
+    ngrams = set()
+    for line in file_obj:
+        words = line.split()
+        for i in range(len(words)):
+            for j in range(i+1, min(len(words), i+max_ngram)+1):
+                ngrams.add(b' '.join(words[i:j]))
+    return frozenset(ngrams)
+
+
+def matches_source(line, ngrams, max_ngram):
+    """check if all sequences of terminals on the source side of a rule occur in the set of n-grams.
+    Sequences that are longer than max_ngram are not checked."""
+    terminals = []
+    for word in line.split(b'|||')[0].split()[:-1] + [b'[']:
+        if word.startswith(b'['):
+            if terminals and len(terminals) <= max_ngram and b' '.join(terminals) not in ngrams:
+                return False
+            terminals = []
+        else:
+            terminals.append(word)
+    return True
+
+
+def filter_lines(lines, vocab, keep, discard, ngrams=None, max_ngram=MAX_NGRAM):
+    """call keep() or discard() for each line; return the number of lines and of discarded lines.
+    If ngrams is given, rules whose source side does not match it are also discarded."""
+    count = 0
+    dcount = 0
+    for line in lines:
+        count += 1
+        if has_oov(line, vocab) or (ngrams is not None and not matches_source(line, ngrams, max_ngram)):
+            discard(line)
+            dcount += 1
+        else:
+            keep(line)
+    return count, dcount
+
+
+def read_vocab(path):
+    with fileio.open_input(path) as vocab_file:
+        return frozenset(item.strip() for item in vocab_file)
+
+
+def get_chunks(table, chunk_size):
+    """split a memory-mapped table into (start, end) byte ranges of roughly chunk_size bytes that end with a newline"""
+    start = 0
+    size = len(table)
+    while start < size:
+        end = table.find(b'\n', min(start + chunk_size, size) - 1)
+        if end == -1:
+            end = size
+        else:
+            end += 1
+        yield start, end
+        start = end
+
+
+def init_worker(vocab, path, ngrams, max_ngram):
+    global worker_vocab, worker_table, worker_ngrams, worker_max_ngram
+    worker_vocab = vocab
+    worker_ngrams = ngrams
+    worker_max_ngram = max_ngram
+    table_file = open(path, 'rb')
+    worker_table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def filter_chunk(chunk):
+    """filter the lines of one chunk of the table; return kept lines, discarded lines, and line counts"""
+    start, end = chunk
+    kept = []
+    discarded = []
+    count, dcount = filter_lines(io.BytesIO(worker_table[start:end]), worker_vocab, kept.append, discarded.append,
+                                 worker_ngrams, worker_max_ngram)
+    return b''.join(kept), b''.join(discarded), count, dcount
+
+
+def filter_parallel(path, vocab, out_obj, discarded_obj, jobs, chunk_size, ngrams=None, max_ngram=MAX_NGRAM):
+
+    with open(path, 'rb') as table_file:
+        try:
+            table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return 0, 0
+        chunks = list(get_chunks(table, chunk_size))
+        table.close()
+
+    count = 0
+    dcount = 0
+    # at most 2*jobs chunks are in memory at a time, also if writing the output is slower than filtering
+    for kept, discarded, chunk_count, chunk_dcount in parallel.imap_ordered(filter_chunk, chunks, jobs, init_worker, (vocab, path, ngrams, max_ngram)):
+        out_obj.write(kept)
+        discarded_obj.write(discarded)
+        count += chunk_count
+        dcount += chunk_dcount
+
+    return count, dcount
+
+
+def parse_arguments():
+
+    help_text = "filter out all phrases in a phrase table that contain words that are not in the provided vocabulary file\n"
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=help_text)
+
+    parser.add_argument('vocabulary', metavar='VOCABULARY_FILE',
+                    help='target-side vocabulary, one word per line')
+    parser.add_argument('--table', metavar='PATH',
+                    help='phrase table (default: standard input); required for --jobs')
+    parser.add_argument('--output', metavar='PATH',
+                    help='filtered phrase table (default: standard output)')
+    parser.add_argument('--discarded', default='discarded', metavar='PATH',
+                    help='file for discarded lines (default: %(default)s)')
+    parser.add_argument('--test-set', metavar='PATH',
+                    help='source side of the test set; discard rules with source terminals that do not occur in it')
+    parser.add_argument('--max-ngram', type=int, default=MAX_NGRAM, metavar='N',
+                    help='longest sequence of source terminals that is checked against the test set (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                    help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, metavar='BYTES',
+                    help='size of the chunks of the table that are sent to the workers (default: %(default)s)')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    profiling.start_from_environment()
+
+    args = parse_arguments()
+
+    vocab = read_vocab(args.vocabulary)
+
+    if args.test_set:
+        with fileio.open_input(args.test_set) as test_set:
+            ngrams = index_ngrams(test_set, args.max_ngram)
     else:
-        print line,
+        ngrams = None
+
+    out_obj = fileio.open_output(args.output)
+    discarded = fileio.open_output(args.discarded)
+
+    if args.jobs > 1:
+        if not args.table:
+            sys.stderr.write('Error: --jobs requires --table\n')
+            sys.exit(1)
+        with io.open(args.table, 'rb') as table_file:
+            compressed = fileio.detect_compression(table_file)
+        if compressed:
+            sys.stderr.write('Warning: {0} is compressed and cannot be memory-mapped; filtering in a single process\n'.format(args.table))
+            args.jobs = 1
+
+    if args.jobs > 1:
+        count, dcount = filter_parallel(args.table, vocab, out_obj, discarded, args.jobs, args.chunk_size, ngrams, args.max_ngram)
+    else:
+        table = fileio.open_input(args.table)
+        count, dcount = filter_lines(table, vocab, out_obj.write, discarded.write, ngrams, args.max_ngram)
+
+    discarded.close()
 
-sys.stderr.write('{0} out of {1} lines discarded\n'.format(dcount, count))
+    sys.stderr.write('{0} out of {1} lines discarded\n'.format(dcount, count))
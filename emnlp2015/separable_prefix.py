@@ -4,15 +4,34 @@
 
 # normalize representation of German particle verbs to common representation
 # described in Rico Sennrich and Barry Haddow (2015). A Joint Dependency Model of Morphological and Syntactic Structure for Statistical Machine Translation. Proceedings of EMNLP.
+#
+# usage: separable_prefix.py SMOR_MODEL [-block-size N] < INPUT > OUTPUT
+#
+# input is processed in blocks of N lines (default 1000); the verbs of each block are analysed with one batch request.
+# with -block-size 1, each line is processed as soon as it is read.
+# with --progress SECONDS (or --progress-file PATH), the progress is reported periodically (see wmt14/progress.py).
 
 from __future__ import print_function, unicode_literals
 import sys
+import os
 import codecs
 from collections import defaultdict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import profiling
+from wmt14 import progress
+from wmt14.lazy import lazy_import
+
 import fst_wrapper
 
-from lxml import etree as ET
+ET = lazy_import('lxml.etree')
+
+BLOCK_SIZE = 1000
+
+# SMOR analyser (FstWrapper) and cache of has_vpart() results; set in main (or by the importing script)
+smor = None
+smor_cache = {}
 
 def get_text(element, text):
     if element.text:
@@ -100,38 +119,130 @@ def has_vpart(word):
     if word in smor_cache:
         return smor_cache[word]
     else:
-        analyses = sorted(smor.analyse(word), key=lambda x: x.count('<'))
-        analyses = [x for x in analyses if '<+V>' in x]
-        if analyses and all('<#>' in line for line in analyses):
-            prefix_len = analyses[0].index('<#>')
-            if analyses[0].startswith('<CAP>'):
-                prefix_len -= 5
-            has_zu = "<zu>" in analyses[0]
-            smor_cache[word] = word[:prefix_len], word[prefix_len:], has_zu
-            return word[:prefix_len], word[prefix_len:], has_zu
-        else:
-            smor_cache[word] = False
-            return False
+        split = get_vpart(word, smor.analyse(word))
+        smor_cache[word] = split
+        return split
+
+
+def get_vpart(word, analyses):
+    """return (prefix, verb, has_zu) if all verb analyses of word have a separable prefix, False otherwise"""
+    analyses = sorted(analyses, key=lambda x: x.count('<'))
+    analyses = [x for x in analyses if '<+V>' in x]
+    if analyses and all('<#>' in line for line in analyses):
+        prefix_len = analyses[0].index('<#>')
+        if analyses[0].startswith('<CAP>'):
+            prefix_len -= 5
+        has_zu = "<zu>" in analyses[0]
+        return word[:prefix_len], word[prefix_len:], has_zu
+    else:
+        return False
+
+
+def prefetch_vpart(xmls):
+    """analyse all verbs in a block of sentences that are not cached yet with one batch request,
+    so that convert_ptkvz() finds all analyses in the cache"""
+    words = []
+    seen = set()
+    for xml in xmls:
+        # convert_ptkvz() checks all elements except the root
+        for element in xml.iterdescendants():
+            if element.get('label').startswith('VV') and element.text:
+                word = element.text.strip()
+                if word not in smor_cache and word not in seen:
+                    seen.add(word)
+                    words.append(word)
+    if words:
+        for word, analyses in zip(words, smor.analyse_batch(words)):
+            smor_cache[word] = get_vpart(word, analyses)
+
+
+def read_blocks(file_obj, block_size):
+    """split input into blocks of (at most) block_size lines"""
+    block = []
+    for line in file_obj:
+        block.append(line)
+        if len(block) == block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def restructure_block(block):
+    """restructure the particle verbs in a block of input lines, and return the output lines"""
+    xmls = [None if line == '\n' else ET.fromstring(line) for line in block]
+    prefetch_vpart([xml for xml in xmls if xml is not None])
+    output = []
+    for line, xml in zip(block, xmls):
+        if xml is None:
+            output.append(line)
+            continue
+        convert_ptkvz(xml)
+        escape_xml(xml)
+        output.append(escape_text(ET.tostring(xml, encoding="UTF-8").decode("UTF-8") + '\n'))
+    return output
+
+
+def get_progress():
+    """return the statistics of the analyses of verbs for progress reports"""
+    stats = {'verbs': len(smor_cache)}
+    if smor.server is None:
+        stats.update(progress.percentiles(smor.latencies))
+    return stats
+
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('smor_wait', fst_wrapper.FstWrapper.send)
+
+
+def pop_block_size_argument(argv):
+    """remove the option '-block-size N' from a list of command line arguments, and return N (default: BLOCK_SIZE).
+    Exits with an error message if N is missing or not a positive integer."""
+    if '-block-size' not in argv:
+        return BLOCK_SIZE
+    i = argv.index('-block-size')
+    try:
+        block_size = int(argv[i+1])
+    except (IndexError, ValueError):
+        block_size = 0
+    if block_size < 1:
+        sys.stderr.write('Error: -block-size requires a positive integer\n')
+        sys.exit(1)
+    del argv[i:i+2]
+    return block_size
 
 
 if __name__ == '__main__':
 
+    profiling.start_from_environment()
+
     if '-train' in sys.argv:
         sys.exit(0)
 
+    input_path, output_path = fileio.pop_io_arguments(sys.argv)
+    progress_interval, progress_file = progress.pop_progress_arguments(sys.argv)
+    block_size = pop_block_size_argument(sys.argv)
+
     smor = fst_wrapper.FstWrapper('fst-mor', sys.argv[1])
     smor_cache = {}
 
+    sys.stdin = fileio.open_input(input_path, 'UTF-8')
+    sys.stdout = fileio.open_output(output_path, 'UTF-8')
+
     if sys.version_info < (3, 0):
         sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
-        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-        sys.stdin = codecs.getreader('UTF-8')(sys.stdin)
 
-    for line in sys.stdin:
-        if line == '\n':
+    file_obj = sys.stdin
+    progress_obj = progress.create(progress_interval, progress_file)
+    if progress_obj is not None:
+        progress_obj.track_input(sys.stdin)
+        progress_obj.add_source('SMOR', get_progress)
+        progress_obj.start()
+        file_obj = progress_obj.count_lines(file_obj)
+
+    for block in read_blocks(file_obj, block_size):
+        for line in restructure_block(block):
             sys.stdout.write(line)
-            continue
-        xml = ET.fromstring(line)
-        convert_ptkvz(xml)
-        escape_xml(xml)
-        sys.stdout.write(escape_text(ET.tostring(xml, encoding="UTF-8").decode("UTF-8") + '\n'))
\ No newline at end of file
+
+    if progress_obj is not None:
+        progress_obj.stop()
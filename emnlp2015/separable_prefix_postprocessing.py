@@ -4,20 +4,34 @@
 
 # restore original representation of particle verbs.
 # described in Rico Sennrich and Barry Haddow (2015). A Joint Dependency Model of Morphological and Syntactic Structure for Statistical Machine Translation. Proceedings of EMNLP.
+# with --nbest, the input is a Moses n-best list with trees as hypotheses
+# with --jobs N, lines are processed by N worker processes, in blocks of about --block-bytes bytes (default: 1 MB);
+# the output is in the input order.
+# with --cache-size N or --cache-file PATH, results for duplicate lines are reused (see wmt14/cache.py).
+# with --compact, trees are parsed as tree.CompactTree, which needs less memory; the output is the same.
 
 from __future__ import unicode_literals
 import sys
+import os
 import codecs
+from functools import partial
 import tree
+import nbest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import cache
+from wmt14 import profiling
 
 def first_leaf(node):
-    if isinstance(node, tree.Tree) and len(node):
+    if isinstance(node, tree.TREE_TYPES) and len(node):
         return first_leaf(node[0])
     else:
         return node
 
 def last_leaf(node):
-    if isinstance(node, tree.Tree) and len(node):
+    if isinstance(node, tree.TREE_TYPES) and len(node):
         return last_leaf(node[-1])
     else:
         return node
@@ -25,12 +39,12 @@ def last_leaf(node):
 def comma_enclosure(node):
     comma = False
     if len(node):
-        if first_leaf(node).strip() == b',' and not node.node.startswith('kon'):
+        if first_leaf(node).strip() == b',' and not node.node.startswith(b'kon'):
             comma = True
             if comma and len(node) > 1 and last_leaf(node).strip() != b',':
-                node.append(tree.Tree(b'[comma [$, ,]]'))
+                node.append(type(node).fast_parse(b'[comma [$, ,]]'))
                 return
-        elif isinstance(node, tree.Tree) and len(node):
+        elif isinstance(node, tree.TREE_TYPES) and len(node):
             comma_enclosure(node[-1])
 
 def convert_ptkvz(node):
@@ -40,7 +54,7 @@ def convert_ptkvz(node):
     v_pos = None
 
     for i,child in list(enumerate(node)):
-        if isinstance(child, tree.Tree):
+        if isinstance(child, tree.TREE_TYPES):
             convert_ptkvz(child)
 
             if child.node == b'avz':
@@ -92,12 +106,61 @@ def convert_ptkvz(node):
         
 
 
+def restore_ptkvz(tree_string, write_tree=False, compact=False):
+    """restore particle verbs in a tree string, and return the tree (write_tree=True) or its string"""
+    if compact:
+        my_tree = tree.CompactTree.fast_parse(tree_string)
+    else:
+        my_tree = tree.Tree.fast_parse(tree_string)
+    convert_ptkvz(my_tree)
+    if write_tree:
+        return my_tree.fast_pprint_flat()
+    else:
+        return b' '.join([leaf for leaf in my_tree.leaves() if leaf not in [b'<s>', b'</s>']])
+
+
+def restore_lines(file_obj, out_obj, write_tree=False, nbest_list=False, compact=False):
+    if nbest_list:
+        nbest.process_nbest(file_obj, out_obj, partial(restore_ptkvz, write_tree=write_tree, compact=compact))
+    else:
+        for line in file_obj:
+            out_obj.write(restore_ptkvz(line, write_tree, compact) + b'\n')
+
+
+def restore_block(lines, write_tree=False, nbest_list=False, compact=False):
+    if nbest_list:
+        return list(nbest.map_nbest(lines, partial(restore_ptkvz, write_tree=write_tree, compact=compact)))
+    else:
+        return [restore_ptkvz(line, write_tree, compact) + b'\n' for line in lines]
+
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('parse', tree.Tree.fast_parse)
+profiling.register('serialize', tree.Tree.fast_pprint_flat)
+
+
 if __name__ == '__main__':
 
-    for line in sys.stdin:
-        my_tree = tree.Tree(line)
-        convert_ptkvz(my_tree)
-        if '--tree' in sys.argv:
-            sys.stdout.write(my_tree._pprint_flat(nodesep=b'', parens=b'[]', quotes=False) + b'\n')
-        else:
-            sys.stdout.write(b' '.join([leaf for leaf in my_tree.leaves() if leaf not in [b'<s>', b'</s>']]) + b'\n')
\ No newline at end of file
+    profiling.start_from_environment()
+
+    input_path, output_path = fileio.pop_io_arguments(sys.argv)
+    jobs, block_bytes = parallel.pop_parallel_arguments(sys.argv)
+    cache_size, cache_file = cache.pop_cache_arguments(sys.argv)
+    file_obj = fileio.open_input(input_path)
+    out_obj = fileio.open_output(output_path)
+
+    write_tree = '--tree' in sys.argv
+    nbest_list = '--nbest' in sys.argv
+    compact = '--compact' in sys.argv
+
+    line_cache = cache.create('ptkvz-post', 'tree={0} nbest={1}'.format(write_tree, nbest_list), cache_size, cache_file)
+
+    if jobs > 1 or line_cache is not None:
+        function = partial(restore_block, write_tree=write_tree, nbest_list=nbest_list, compact=compact)
+        for output in parallel.map_units(function, file_obj, jobs, block_bytes, line_cache):
+            out_obj.write(output)
+        if line_cache is not None:
+            line_cache.close()
+            line_cache.report()
+    else:
+        restore_lines(file_obj, out_obj, write_tree, nbest_list, compact)
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# perform compound splitting, hyphen splitting and particle verb restructuring in a single process.
+# this produces the same output as split_and_restructure.sh:
+#
+#   split_and_restructure.sh SCRIPT_DIR SMOR_MODEL [OPTIONS]
+#
+# is equivalent to:
+#
+#   split_and_restructure.py -smor SMOR_MODEL -write-filler -no-truecase -q -syntax -fewest -dependency [OPTIONS]
+#
+# all options of hybrid_compound_splitter.py are accepted (hyphen splitting is done with -syntax if it is given),
+# and the particle verbs of each block of lines are analysed with one batch request (see separable_prefix.py).
+# compound splitting and particle verb restructuring share the fst-mor process (or the SMOR server).
+
+from __future__ import unicode_literals
+import sys
+import os
+import codecs
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hybrid_compound_splitter
+from wmt14 import fileio
+from wmt14 import cache
+from wmt14 import profiling
+import separable_prefix
+
+# the file name is not a valid module name
+hyphen_splitter = __import__('hyphen-splitter')
+
+
+def parse_arguments():
+
+    parser = hybrid_compound_splitter.get_parser()
+    parser.description = "compound splitting, hyphen splitting and particle verb restructuring in one process\n"
+
+    parser.add_argument('-block-size', type=int, default=separable_prefix.BLOCK_SIZE, metavar='N',
+                    help='number of lines for which particle verbs are analysed in one batch (default: %(default)s)')
+
+    return parser.parse_args()
+
+
+def main(file_obj, args):
+
+    freq = hybrid_compound_splitter.load_model(args)
+    truecase = hybrid_compound_splitter.get_truecase(freq, args.no_truecase)
+
+    if args.smor:
+        smor_server = hybrid_compound_splitter.SMORSplitter(args.smor, args.no_truecase, args.smor_server, args.smor_cache_size,
+                                                            args.smor_timeout, args.smor_restarts)
+        split_function = hybrid_compound_splitter.get_FST_splits
+        separable_prefix.smor = smor_server.smor
+    else:
+        sys.stderr.write('Error: particle verb restructuring requires a SMOR model (option -smor)\n')
+        sys.exit(1)
+
+    line_cache = cache.create('split-restructure', hybrid_compound_splitter.cache_options(args), args.cache_size, args.cache_file)
+
+    for block in separable_prefix.read_blocks(file_obj, args.block_size):
+        # only lines that are not in the cache are processed (each distinct line once)
+        if line_cache is not None:
+            results, todo = line_cache.lookup_block(block)
+        else:
+            todo = block
+        lines = []
+        for line in todo:
+            line = hybrid_compound_splitter.split_line(line, freq, truecase, smor_server, split_function,
+                                                       args.write_junctures, args.merge_junctures, args.syntax,
+                                                       args.no_truecase, args.dependency)
+            # hyphen-splitter.py is called with -syntax only
+            line = hyphen_splitter.split_hyphens(line, False, args.syntax, False)
+            lines.append(line)
+        output = separable_prefix.restructure_block(lines)
+        if line_cache is not None:
+            computed = dict(zip(todo, output))
+            output = []
+            for line, result in zip(block, results):
+                if result is None:
+                    result = computed[line]
+                    line_cache.put(line, result)
+                output.append(result)
+        for line in output:
+            sys.stdout.write(line)
+
+    if line_cache is not None:
+        line_cache.close()
+        line_cache.report()
+
+    smor_server.report(sys.stderr, not args.q)
+
+
+if __name__ == '__main__':
+
+    profiling.start_from_environment()
+
+    args = parse_arguments()
+
+    if args.train:
+        sys.stderr.write('Error: use hybrid_compound_splitter.py for training\n')
+        sys.exit(1)
+
+    hybrid_compound_splitter.set_options(args)
+
+    args.corpus = fileio.open_input(args.corpus, 'UTF-8')
+    sys.stdout = fileio.open_output(args.output, 'UTF-8')
+
+    if sys.version_info < (3, 0):
+        sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
+
+    main(args.corpus, args)
@@ -1,6 +1,7 @@
 #!/bin/bash
 
 #perform compound splitting and particle verb restructuring
+#if the environment variable SMOR_SERVER is set to the socket of a running smor_server.py, both steps use its fst-mor processes and cache
 
 script_dir=$1
 shift
@@ -50,6 +50,11 @@ syntax trees and morphological trees.
 
 
 import re
+import array
+
+# token patterns for the fast parser (square brackets, default node and leaf patterns), for text and byte strings
+_FAST_TOKEN_RE = re.compile(u(r'\[|\]|[^\s\[\]]+'))
+_FAST_TOKEN_RE_BYTES = re.compile(b(r'\[|\]|[^\s\[\]]+'))
 
 ######################################################################
 ## Trees
@@ -124,7 +129,7 @@ class Tree(list):
             if not isinstance(node_or_str, string_types):
                 raise TypeError("%s: Expected a node value and child list "
                                 "or a single string" % type(self).__name__)
-            tree = type(self).parse(node_or_str)
+            tree = type(self).fast_parse(node_or_str)
             list.__init__(self, tree)
             self.node = tree.node
         elif isinstance(children, string_types):
@@ -139,21 +144,21 @@ class Tree(list):
     #////////////////////////////////////////////////////////////
 
     def __eq__(self, other):
-        if not isinstance(other, Tree): return False
+        if not isinstance(other, TREE_TYPES): return False
         return self.node == other.node and list.__eq__(self, other)
     def __ne__(self, other):
         return not (self == other)
     def __lt__(self, other):
-        if not isinstance(other, Tree): return False
+        if not isinstance(other, TREE_TYPES): return False
         return self.node < other.node or list.__lt__(self, other)
     def __le__(self, other):
-        if not isinstance(other, Tree): return False
+        if not isinstance(other, TREE_TYPES): return False
         return self.node <= other.node or list.__le__(self, other)
     def __gt__(self, other):
-        if not isinstance(other, Tree): return True
+        if not isinstance(other, TREE_TYPES): return True
         return self.node > other.node or list.__gt__(self, other)
     def __ge__(self, other):
-        if not isinstance(other, Tree): return False
+        if not isinstance(other, TREE_TYPES): return False
         return self.node >= other.node or list.__ge__(self, other)
 
     #////////////////////////////////////////////////////////////
@@ -235,7 +240,7 @@ class Tree(list):
         """
         leaves = []
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 leaves.extend(child.leaves())
             else:
                 leaves.append(child)
@@ -276,7 +281,7 @@ class Tree(list):
         """
         max_child_height = 0
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 max_child_height = max(max_child_height, child.height())
             else:
                 max_child_height = max(max_child_height, 1)
@@ -298,7 +303,7 @@ class Tree(list):
         positions = []
         if order in ('preorder', 'bothorder'): positions.append( () )
         for i, child in enumerate(self):
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 childpos = child.treepositions(order)
                 positions.extend((i,)+p for p in childpos)
             else:
@@ -326,7 +331,7 @@ class Tree(list):
         if not filter or filter(self):
             yield self
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 for subtree in child.subtrees(filter):
                     yield subtree
 
@@ -349,7 +354,7 @@ class Tree(list):
 
         prods = [Production(Nonterminal(self.node), _child_names(self))]
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 prods += child.productions()
         return prods
 
@@ -367,7 +372,7 @@ class Tree(list):
         """
         pos = []
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 pos.extend(child.pos())
             else:
                 pos.append((child, self.node))
@@ -387,7 +392,7 @@ class Tree(list):
         stack = [(self, ())]
         while stack:
             value, treepos = stack.pop()
-            if not isinstance(value, Tree):
+            if not isinstance(value, TREE_TYPES):
                 if index == 0: return treepos
                 else: index -= 1
             else:
@@ -503,7 +508,7 @@ class Tree(list):
         :param tree: The tree that should be converted.
         :return: The new Tree.
         """
-        if isinstance(tree, Tree):
+        if isinstance(tree, TREE_TYPES):
             children = [cls.convert(child) for child in tree]
             return cls(tree.node, children)
         else:
@@ -666,6 +671,70 @@ class Tree(list):
         msg += '\n%s"%s"\n%s^' % (' '*16, s, ' '*(17+offset))
         raise ValueError(msg)
 
+    @classmethod
+    def fast_parse(cls, s):
+        """
+        Parse a bracketed tree string with square brackets, like
+        ``parse(s)`` with default arguments, but faster: the token
+        pattern is compiled once, and trees are created without
+        copying their children.  Byte strings are also accepted (in
+        which case nodes and leaves are byte strings).
+
+            >>> print(Tree.fast_parse('[S [NP I] [VP [V saw] [NP him]]]'))
+            [S [NP I] [VP [V saw] [NP him]]]
+
+        Malformed strings are passed on to ``parse()``, which raises
+        a ``ValueError`` with a description of the problem.
+        """
+        if isinstance(s, bytes):
+            tokens = _FAST_TOKEN_RE_BYTES.findall(s)
+            open_b, close_b, empty = b('['), b(']'), b('')
+        else:
+            tokens = _FAST_TOKEN_RE.findall(s)
+            open_b, close_b, empty = u('['), u(']'), u('')
+
+        # list methods are called directly, so that subclasses do not register the construction as a modification
+        new = list.__new__
+        append = list.append
+        root = None
+        stack = []
+        i = 0
+        length = len(tokens)
+        while i < length:
+            token = tokens[i]
+            i += 1
+            # Beginning of a tree/subtree; the token after the bracket is the node
+            if token == open_b:
+                tree = new(cls)
+                if i < length and tokens[i] != open_b and tokens[i] != close_b:
+                    tree.node = tokens[i]
+                    i += 1
+                else:
+                    tree.node = empty
+                if stack:
+                    append(stack[-1], tree)
+                elif root is None:
+                    root = tree
+                else:
+                    break
+                stack.append(tree)
+            # End of a tree/subtree
+            elif token == close_b:
+                if not stack:
+                    break
+                stack.pop()
+            # Leaf node
+            elif stack:
+                append(stack[-1], token)
+            else:
+                break
+        else:
+            if root is not None and not stack:
+                return root
+
+        # let the slow parser produce an error message
+        return cls.parse(s)
+
     #////////////////////////////////////////////////////////////
     # Visualization & String Representation
     #////////////////////////////////////////////////////////////
@@ -703,7 +772,7 @@ class Tree(list):
         else:
             s = '%s%r%s' % (parens[0], self.node, nodesep)
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 s += '\n'+' '*(indent+2)+child.pprint(margin, indent+2,
                                                   nodesep, parens, quotes)
             elif isinstance(child, tuple):
@@ -737,7 +806,7 @@ class Tree(list):
     def _pprint_flat(self, nodesep, parens, quotes):
         childstrs = []
         for child in self:
-            if isinstance(child, Tree):
+            if isinstance(child, TREE_TYPES):
                 childstrs.append(child._pprint_flat(nodesep, parens, quotes))
             elif isinstance(child, tuple):
                 childstrs.append("/".join(child))
@@ -752,6 +821,341 @@ class Tree(list):
             return '%s%r%s %s%s' % (parens[0], self.node, nodesep,
                                     " ".join(childstrs), parens[1])
 
+    def fast_pprint_flat(self):
+        """
+        Return the same string as ``_pprint_flat('', '[]', False)``,
+        but build it without recursion in a single buffer.  If the
+        tree contains byte strings, a byte string is returned.
+        """
+        if isinstance(self.node, bytes) and not isinstance(self.node, string_types):
+            open_b, close_b, space, text_types = b(' ['), b(']'), b(' '), (bytes,)
+        else:
+            open_b, close_b, space, text_types = ' [', ']', ' ', string_types
+
+        out = []
+        append = out.append
+        # stack of iterators over children; every token is written with a preceding space, which is removed at the end
+        stack = [iter((self,))]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, TREE_TYPES):
+                    if isinstance(child.node, text_types):
+                        append(open_b + child.node)
+                    else:
+                        append('%s%r' % (open_b, child.node))
+                    if not len(child):
+                        append(space)
+                    stack.append(iter(child))
+                    break
+                elif isinstance(child, tuple):
+                    append(space + "/".join(child))
+                elif isinstance(child, text_types):
+                    append(space + child)
+                else:
+                    append(space + '%r' % child)
+            else:
+                stack.pop()
+                append(close_b)
+        # remove leading space and closing bracket of the outermost iterator
+        return space[:0].join(out)[1:-1]
+
+
+
+######################################################################
+## Compact Trees
+######################################################################
+
+def _compact_mutator(name):
+    """wrap a list method so that calling it invalidates the cached leaves of the tree and of the trees that contain it"""
+    method = getattr(list, name)
+    def mutator(self, *args, **kwargs):
+        self._modified()
+        return method(self, *args, **kwargs)
+    mutator.__name__ = name
+    mutator.__doc__ = method.__doc__
+    return mutator
+
+
+class CompactTree(list):
+    """
+    A Tree with a smaller memory footprint: nodes have no instance
+    dictionary, only slots for the node value and a cached leaf view.
+    The interface is that of ``Tree`` (construction, indexing with
+    tree positions, ``node``, ``leaves()``, parsing and printing).
+    Use ``TREE_TYPES`` instead of ``Tree`` to test whether an object
+    is a (sub)tree.
+
+        >>> from tree import CompactTree
+        >>> t = CompactTree('[S [NP I] [VP [V saw] [NP him]]]')
+        >>> t[1,0].node
+        'V'
+        >>> t.leaf_view()
+        ('I', 'saw', 'him')
+        >>> t[1,1,0] = 'her'
+        >>> t.leaves()
+        ['I', 'saw', 'her']
+
+    ``leaf_view()`` returns a tuple that is reused until the tree or
+    one of its subtrees is modified.  Modifications are only registered
+    through the methods of ``CompactTree``, and a subtree should belong
+    to only one tree.  The leaves of a tree that contains ``Tree``
+    subtrees are not cached (see ``convert()``).
+    """
+    __slots__ = ('node', '_leaves', '_parent')
+
+    __init__ = Tree.__dict__['__init__']
+
+    __eq__ = Tree.__dict__['__eq__']
+    __ne__ = Tree.__dict__['__ne__']
+    __lt__ = Tree.__dict__['__lt__']
+    __le__ = Tree.__dict__['__le__']
+    __gt__ = Tree.__dict__['__gt__']
+    __ge__ = Tree.__dict__['__ge__']
+
+    __mul__ = Tree.__dict__['__mul__']
+    __rmul__ = Tree.__dict__['__rmul__']
+    __add__ = Tree.__dict__['__add__']
+    __radd__ = Tree.__dict__['__radd__']
+
+    __getitem__ = Tree.__dict__['__getitem__']
+
+    def __setitem__(self, index, value):
+        self._modified()
+        Tree.__dict__['__setitem__'](self, index, value)
+
+    def __delitem__(self, index):
+        self._modified()
+        Tree.__dict__['__delitem__'](self, index)
+
+    append = _compact_mutator('append')
+    extend = _compact_mutator('extend')
+    insert = _compact_mutator('insert')
+    pop = _compact_mutator('pop')
+    remove = _compact_mutator('remove')
+    reverse = _compact_mutator('reverse')
+    sort = _compact_mutator('sort')
+    __iadd__ = _compact_mutator('__iadd__')
+    __imul__ = _compact_mutator('__imul__')
+    # Python 2 calls these for simple slices instead of __setitem__/__delitem__
+    if hasattr(list, '__setslice__'):
+        __setslice__ = _compact_mutator('__setslice__')
+        __delslice__ = _compact_mutator('__delslice__')
+
+    def _modified(self):
+        """drop the cached leaves of this tree, and of all trees that contain it"""
+        node = self
+        seen = set()
+        # parent links are only set by leaf_view(), and may be outdated, so they can form a cycle
+        while isinstance(node, CompactTree) and id(node) not in seen:
+            seen.add(id(node))
+            node._leaves = None
+            node = getattr(node, '_parent', None)
+
+    def leaf_view(self):
+        """
+        :return: a tuple with the leaves of the tree.  It is cached,
+            and only recomputed after the tree has been modified.
+        :rtype: tuple
+        """
+        leaves = getattr(self, '_leaves', None)
+        if leaves is None:
+            leaves = []
+            cached = True
+            stack = [(self, iter(self))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if isinstance(child, TREE_TYPES):
+                        if isinstance(child, CompactTree):
+                            # so that modifications of the subtree reach this tree
+                            child._parent = node
+                        else:
+                            # modifications of a Tree are not registered
+                            cached = False
+                        stack.append((child, iter(child)))
+                        break
+                    leaves.append(child)
+                else:
+                    stack.pop()
+            leaves = tuple(leaves)
+            if cached:
+                self._leaves = leaves
+        return leaves
+
+    def leaves(self):
+        """
+        :return: a list containing this tree's leaves (a copy of ``leaf_view()``).
+        :rtype: list
+        """
+        return list(self.leaf_view())
+
+    def flatten(self):
+        return type(self)(self.node, self.leaf_view())
+
+    height = Tree.__dict__['height']
+    treepositions = Tree.__dict__['treepositions']
+    subtrees = Tree.__dict__['subtrees']
+    pos = Tree.__dict__['pos']
+
+    convert = Tree.__dict__['convert']
+    copy = Tree.__dict__['copy']
+
+    parse = Tree.__dict__['parse']
+    _parse_error = Tree.__dict__['_parse_error']
+    fast_parse = Tree.__dict__['fast_parse']
+
+    __repr__ = Tree.__dict__['__repr__']
+    __str__ = Tree.__dict__['__str__']
+    pprint = Tree.__dict__['pprint']
+    _pprint_flat = Tree.__dict__['_pprint_flat']
+    fast_pprint_flat = Tree.__dict__['fast_pprint_flat']
+
+
+# use isinstance(x, TREE_TYPES) to test for subtrees of either class
+TREE_TYPES = (Tree, CompactTree)
+
+
+class CompactForest(object):
+    """
+    A collection of trees in a flat layout: all nodes and leaves of
+    all trees are stored in three integer arrays (the label id, the
+    parent and the first child of each node), and node values and
+    leaves are stored only once in a shared string table.  The
+    children of a node are stored next to each other, so they are
+    found by following ``first_child`` while ``parent`` stays the same.
+    This needs much less memory than keeping the trees as objects,
+    and trees are converted to ``CompactTree`` on access.
+
+        >>> from tree import CompactForest
+        >>> forest = CompactForest()
+        >>> forest.append('[S [NP I] [VP [V saw] [NP him]]]')
+        0
+        >>> forest.append('[S [NP he] [VP [V saw] [NP me]]]')
+        1
+        >>> forest.leaves(1)
+        ['he', 'saw', 'me']
+        >>> print(forest[0])
+        [S [NP I] [VP [V saw] [NP him]]]
+        >>> len(forest.strings)
+        9
+    """
+
+    def __init__(self, trees=()):
+        # shared string table, and the position of each string in it
+        self.strings = []
+        self.string_ids = {}
+        # per node: id in the string table (-id-1 for leaves), parent node (-1 for roots), first child (-1 if none)
+        self.label = array.array('i')
+        self.parent = array.array('i')
+        self.first_child = array.array('i')
+        # root node of each tree
+        self.roots = array.array('i')
+        for t in trees:
+            self.append(t)
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __getitem__(self, index):
+        return self.tree(index)
+
+    def __iter__(self):
+        for index in range(len(self.roots)):
+            yield self.tree(index)
+
+    def _add(self, value, parent, leaf=False):
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        position = len(self.label)
+        self.label.append(-string_id-1 if leaf else string_id)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        return position
+
+    def append(self, t):
+        """
+        Add a tree (a ``Tree``, a ``CompactTree``, or a string that
+        is parsed with ``fast_parse()``) to the forest.
+
+        :return: the index of the new tree in the forest.
+        :rtype: int
+        """
+        if not isinstance(t, TREE_TYPES):
+            t = Tree.fast_parse(t)
+        root = self._add(t.node, -1)
+        self.roots.append(root)
+        stack = [(t, root)]
+        while stack:
+            node, position = stack.pop()
+            first_child = len(self.label)
+            for child in node:
+                if isinstance(child, TREE_TYPES):
+                    stack.append((child, self._add(child.node, position)))
+                else:
+                    self._add(child, position, leaf=True)
+            if len(self.label) > first_child:
+                self.first_child[position] = first_child
+        return len(self.roots) - 1
+
+    def children(self, position):
+        """
+        :return: the positions of the children of the node at ``position`` (in the flat arrays).
+        """
+        child = self.first_child[position]
+        if child != -1:
+            parent = self.parent
+            end = len(parent)
+            while child < end and parent[child] == position:
+                yield child
+                child += 1
+
+    def tree(self, index, cls=CompactTree):
+        """
+        :return: the tree at ``index``, converted to ``cls``.
+        """
+        strings = self.strings
+        label = self.label
+        append = list.append
+        new = list.__new__
+        root = self.roots[index]
+        t = new(cls)
+        t.node = strings[label[root]]
+        stack = [(t, root)]
+        while stack:
+            node, position = stack.pop()
+            for child in self.children(position):
+                string_id = label[child]
+                if string_id < 0:
+                    append(node, strings[-string_id-1])
+                else:
+                    subtree = new(cls)
+                    subtree.node = strings[string_id]
+                    append(node, subtree)
+                    stack.append((subtree, child))
+        return t
+
+    def leaves(self, index):
+        """
+        :return: a list with the leaves of the tree at ``index``, read from the flat arrays.
+        :rtype: list
+        """
+        strings = self.strings
+        label = self.label
+        leaves = []
+        stack = [self.children(self.roots[index])]
+        while stack:
+            for child in stack[-1]:
+                string_id = label[child]
+                if string_id < 0:
+                    leaves.append(strings[-string_id-1])
+                else:
+                    stack.append(self.children(child))
+                    break
+            else:
+                stack.pop()
+        return leaves
 
 
 ######################################################################
@@ -829,7 +1233,7 @@ def demo():
     t.node = ('test', 3)
     print(t)
 
-__all__ = ['Tree']
+__all__ = ['Tree', 'CompactTree', 'CompactForest', 'TREE_TYPES']
 
 if __name__ == "__main__":
     import doctest
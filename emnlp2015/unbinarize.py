@@ -2,13 +2,28 @@
 # -*- coding: utf-8 -*-
 # Author: Rico Sennrich
 
+# remove virtual nodes (with labels starting with '^') that were introduced by binarize.py from trees in bracket format
+# with --nbest, the input is a Moses n-best list with trees as hypotheses
+# with --jobs N, lines are processed by N worker processes, in blocks of about --block-bytes bytes (default: 1 MB);
+# the output is in the input order.
+# with --cache-size N or --cache-file PATH, results for duplicate lines are reused (see wmt14/cache.py).
 
 from __future__ import print_function, unicode_literals
 import sys
+import os
+from functools import partial
 import tree
+import nbest
 import re
 
-whitespace = re.compile('\s+')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import cache
+from wmt14 import profiling
+
+re_token = re.compile(r'\[|\]|[^\s\[\]]+')
+re_token_bytes = re.compile(br'\[|\]|[^\s\[\]]+')
 
 def get_unbinarized_children(t, children=None):
 
@@ -16,12 +31,12 @@ def get_unbinarized_children(t, children=None):
         children = []
 
     for child in t:
-        if isinstance(child, tree.Tree) and child.node.startswith('^'):
+        if isinstance(child, tree.TREE_TYPES) and child.node.startswith('^'):
             get_unbinarized_children(child, children)
         else:
             children.append(child)
 
-    if not isinstance(t, tree.Tree) or t.node.startswith('^'):
+    if not isinstance(t, tree.TREE_TYPES) or t.node.startswith('^'):
         return
     else:
         t[:] = children
@@ -29,9 +44,101 @@ def get_unbinarized_children(t, children=None):
             get_unbinarized_children(child)
 
 
+def unbinarize_string(line):
+    """remove virtual nodes from a tree string in a single pass over its tokens, without building a tree.
+    The result is the same as parsing the line, calling get_unbinarized_children(), and printing the tree.
+    Text and byte strings are supported."""
+
+    if isinstance(line, bytes):
+        tokens = re_token_bytes.findall(line)
+        open_b, close_b, space, virtual, empty = b'[', b']', b' ', b'^', b''
+    else:
+        tokens = re_token.findall(line)
+        open_b, close_b, space, virtual, empty = '[', ']', ' ', '^', ''
+
+    out = []
+    # for each open bracket: None if the node is removed, otherwise the length of out after writing the node
+    stack = []
+    remove_virtual = True
+    finished = False
+    i = 0
+    length = len(tokens)
+    while i < length:
+        token = tokens[i]
+        i += 1
+        if token == open_b:
+            if finished:
+                break
+            if i < length and tokens[i] != open_b and tokens[i] != close_b:
+                node = tokens[i]
+                i += 1
+            else:
+                node = empty
+            if not stack:
+                # the root node is never removed; if it is virtual itself, get_unbinarized_children() leaves the tree unchanged
+                remove_virtual = not node.startswith(virtual)
+            elif remove_virtual and node.startswith(virtual):
+                stack.append(None)
+                continue
+            out.append(space + open_b + node)
+            stack.append(len(out))
+        elif token == close_b:
+            if not stack:
+                break
+            position = stack.pop()
+            if position is not None:
+                # node without children
+                if position == len(out):
+                    out.append(space)
+                out.append(close_b)
+            finished = not stack
+        elif stack:
+            out.append(space + token)
+        else:
+            break
+    else:
+        if finished:
+            return empty.join(out)[1:]
+
+    # malformed line: let the tree parser report the error
+    t = tree.Tree.fast_parse(line)
+    get_unbinarized_children(t)
+    return t.fast_pprint_flat()
+
+
+def unbinarize_lines(file_obj, out_obj, nbest_list=False):
+  if nbest_list:
+      nbest.process_nbest(file_obj, out_obj, unbinarize_string)
+  else:
+      for line in file_obj:
+          out_obj.write(unbinarize_string(line) + b'\n')
+
+
+def unbinarize_block(lines, nbest_list=False):
+  if nbest_list:
+      return list(nbest.map_nbest(lines, unbinarize_string))
+  else:
+      return [unbinarize_string(line) + b'\n' for line in lines]
+
 
 if __name__ == '__main__':
-  for line in sys.stdin:
-      t = tree.Tree(line)
-      get_unbinarized_children(t)
-      print(whitespace.sub(' ',t.__str__()))
\ No newline at end of file
+  profiling.start_from_environment()
+  input_path, output_path = fileio.pop_io_arguments(sys.argv)
+  jobs, block_bytes = parallel.pop_parallel_arguments(sys.argv)
+  cache_size, cache_file = cache.pop_cache_arguments(sys.argv)
+  file_obj = fileio.open_input(input_path)
+  out_obj = fileio.open_output(output_path)
+
+  nbest_list = '--nbest' in sys.argv
+
+  line_cache = cache.create('unbinarize', 'nbest={0}'.format(nbest_list), cache_size, cache_file)
+
+  if jobs > 1 or line_cache is not None:
+      function = partial(unbinarize_block, nbest_list=nbest_list)
+      for output in parallel.map_units(function, file_obj, jobs, block_bytes, line_cache):
+          out_obj.write(output)
+      if line_cache is not None:
+          line_cache.close()
+          line_cache.report()
+  else:
+      unbinarize_lines(file_obj, out_obj, nbest_list)
\ No newline at end of file
@@ -8,12 +8,23 @@
 #  Rico Sennrich, Philip Williams, Matthias Huck (2015):
 #    A tree does not make a well-formed sentence: Improving syntactic string-to-tree statistical machine translation with more linguistic knowledge.
 #    In: Computer Speech & Language 32(1), 27-45.
+#
+# with --jobs N, sentences are processed by N worker processes, in blocks of about --block-bytes bytes (default: 1 MB);
+# the output is in the input order.
+# with --cache-size N or --cache-file PATH, results for duplicate sentences are reused (see wmt14/cache.py).
+# with --progress SECONDS (or --progress-file PATH), the progress is reported periodically (see wmt14/progress.py).
 
 from __future__ import print_function, unicode_literals
 import sys
 import codecs
 from collections import defaultdict
 
+from wmt14 import fileio
+from wmt14 import parallel
+from wmt14 import cache
+from wmt14 import profiling
+from wmt14 import progress
+
 #at which point in the morphological output is case information stored
 CASE_POSITION = {b'ADJA':2
                     ,b'PPER':3
@@ -95,24 +106,51 @@ def create_named_dict(values):
 def sorted_values(named_dict):
     return [named_dict[keyword] for keyword in KEYWORDS]
 
+def format_sentence(sentence):
+    return b''.join([b'\t'.join(sorted_values(word)) + b'\n' for word in sentence]) + b'\n'
+
 def write(sentence):
-    for word in sentence:
-        sys.stdout.write(b'\t'.join(sorted_values(word)) + b'\n')
-    sys.stdout.write(b'\n')
+    sys.stdout.write(format_sentence(sentence))
 
-def main(fobj_in):
+def read_sentences(fobj_in):
+    """yield the sentences of a CoNLL file (an incomplete sentence at the end of the file is ignored)"""
     sentence = []
     for line in fobj_in:
 
         if line == b"\n":
-            convert(sentence)
-            write(sentence)
+            yield sentence
             sentence = []
             continue
 
         word = create_named_dict(line.split())
         sentence.append(word)
 
+def main(fobj_in):
+    for sentence in read_sentences(fobj_in):
+        convert(sentence)
+        write(sentence)
+
+def read_sentence_strings(fobj_in):
+    """yield the lines of each sentence of a CoNLL file (including the empty line at its end) as one string"""
+    lines = []
+    for line in fobj_in:
+        lines.append(line)
+        if line == b"\n":
+            yield b''.join(lines)
+            lines = []
+
+def convert_block(sentences):
+    """convert a list of sentences (strings from read_sentence_strings()), and return the list of outputs"""
+    output = []
+    for sentence in read_sentences(b''.join(sentences).splitlines(True)):
+        convert(sentence)
+        output.append(format_sentence(sentence))
+    return output
+
+def init_worker(conversions):
+    global CONVERSIONS
+    CONVERSIONS = conversions
+
 
 def convert(sentence):
 
@@ -337,33 +375,38 @@ def pred_conversion(word, sentence, spans):
     word['func'] += info
     word['proj_func'] += info
 
-def get_morphology(word):
-    morph_info = word['morph'].split(b'|')
-    morph_dict = {}
-
-    tag = word['tag2']
-
-    try:
-        morph_dict['case'] = morph_info[CASE_POSITION[tag]].lower()
-    except (IndexError, KeyError):
-        morph_dict['case'] = b'_'
-
-    try:
-        morph_dict['gender'] = morph_info[GENDER_POSITION[tag]].lower()
-    except (IndexError, KeyError):
-        morph_dict['gender'] = b'_'
-
-    try:
-        morph_dict['number'] = morph_info[NUMBER_POSITION[tag]].lower()
-    except (IndexError, KeyError):
-        morph_dict['number'] = b'_'
+# position of case, gender, number and person information for each tag (None if the tag has no such information)
+MORPH_POSITIONS = dict((tag, tuple(table.get(tag) for table in (CASE_POSITION, GENDER_POSITION, NUMBER_POSITION, PERSON_POSITION)))
+                       for tag in set(CASE_POSITION) | set(GENDER_POSITION) | set(NUMBER_POSITION) | set(PERSON_POSITION))
+NO_POSITIONS = (None, None, None, None)
+
+MORPH_KEYS = ('case', 'gender', 'number', 'person')
+MORPH_CACHE_SIZE = 100000
+morph_cache = {}
+
+def decode_morphology(tag, morph):
+    morph_info = morph.split(b'|')
+    values = []
+    for position in MORPH_POSITIONS.get(tag, NO_POSITIONS):
+        if position is not None and position < len(morph_info):
+            values.append(morph_info[position].lower())
+        else:
+            values.append(b'_')
+    return tuple(values)
 
+def get_morphology(word):
+    key = word['tag2'], word['morph']
     try:
-        morph_dict['person'] = morph_info[PERSON_POSITION[tag]].lower()
-    except (IndexError, KeyError):
-        morph_dict['person'] = b'_'
+        values = morph_cache[key]
+    except KeyError:
+        values = decode_morphology(*key)
+        # the number of distinct tag/morphology pairs is small; only a corrupt input can fill the cache
+        if len(morph_cache) >= MORPH_CACHE_SIZE:
+            morph_cache.clear()
+        morph_cache[key] = values
 
-    return morph_dict
+    # callers may modify the dictionary, so we create a new one for each call
+    return dict(zip(MORPH_KEYS, values))
 
 
 def get_spans(sentence):
@@ -396,20 +439,18 @@ CONVERSIONS = {b'aux':aux_conversion
                 ,b'pred':pred_conversion
                 }
 
-if __name__ == '__main__':
-    if sys.version_info >= (3,0,0):
-        sys.stdin = sys.stdin.buffer
-        sys.stdout = sys.stdout.buffer
-        sys.stderr = sys.stderr.buffer
+def set_conversions(argv):
+    """select the label conversions that are active, based on command line options"""
+    global CONVERSIONS
 
     # conversions used for WMT 14
-    if '--wmt14' in sys.argv:
+    if '--wmt14' in argv:
       CONVERSIONS = {b'root':root_conversion
                 ,b'kon':kon_conversion
                 ,b'cj':kon_conversion
                 ,b'gmod':gmod_conversion}
 
-    if '--wmt15' in sys.argv:
+    if '--wmt15' in argv:
       CONVERSIONS = {b'root':root_conversion
                 ,b'kon':kon_conversion
                 ,b'cj':kon_conversion
@@ -417,15 +458,57 @@ if __name__ == '__main__':
                 ,b'subj':subj_coord_conversion
                 ,b'obji':obji_conversion}
 
-    if '--coord-subj' in sys.argv:
+    if '--coord-subj' in argv:
         CONVERSIONS[b'subj'] = subj_coord_conversion
 
-    if '--obji' in sys.argv:
+    if '--obji' in argv:
         CONVERSIONS[b'obji'] = obji_conversion
 
-    for arg in sys.argv[1:]:
+    for arg in argv[1:]:
         if arg.startswith('--disable_'):
             disabled_class = arg.split('_',1)[1].encode('UTF-8')
             del CONVERSIONS[disabled_class]
 
-    main(sys.stdin)
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('parse', create_named_dict)
+profiling.register('serialize', format_sentence)
+
+
+if __name__ == '__main__':
+    profiling.start_from_environment()
+    input_path, output_path = fileio.pop_io_arguments(sys.argv)
+    jobs, block_bytes = parallel.pop_parallel_arguments(sys.argv)
+    cache_size, cache_file = cache.pop_cache_arguments(sys.argv)
+    progress_interval, progress_file = progress.pop_progress_arguments(sys.argv)
+    sys.stdin = fileio.open_input(input_path)
+    sys.stdout = fileio.open_output(output_path)
+    if sys.version_info >= (3,0,0):
+        sys.stderr = sys.stderr.buffer
+
+    set_conversions(sys.argv)
+
+    options = ' '.join(sorted('{0}={1}'.format(label.decode('UTF-8'), function.__name__) for label, function in CONVERSIONS.items()))
+    sentence_cache = cache.create('enrich', options, cache_size, cache_file)
+
+    fobj_in = sys.stdin
+    progress_obj = progress.create(progress_interval, progress_file, 'sentences')
+    if progress_obj is not None:
+        progress_obj.track_input(sys.stdin)
+        if sentence_cache is not None:
+            progress_obj.add_source('cache', sentence_cache.get_stats)
+        progress_obj.start()
+        fobj_in = progress_obj.count_conll(fobj_in)
+
+    if jobs > 1 or sentence_cache is not None:
+        sentences = read_sentence_strings(fobj_in)
+        for output in parallel.map_units(convert_block, sentences, jobs, block_bytes, sentence_cache, init_worker, (CONVERSIONS,)):
+            sys.stdout.write(output)
+        if sentence_cache is not None:
+            sentence_cache.close()
+            sentence_cache.report()
+    else:
+        main(fobj_in)
+
+    if progress_obj is not None:
+        progress_obj.stop()
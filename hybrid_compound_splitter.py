@@ -17,31 +17,42 @@
 # hybrid_compound_splitter.py -train -syntax -corpus INPUT_FILE -model MODEL_FILE
 # hybrid_compound_splitter.py -write-filler -no-truecase -q -syntax -smor zmorge-{version}-smor_newlemma.a -model MODEL_FILE < INPUT_FILE > OUTPUT_FILE
 
+# To tune -min-size, -min-count, -max-count and -fewest, several configurations can be applied in one pass over the input
+# (sharing tokenization, SMOR analyses and split candidates). CONFIG_FILE has one configuration per line, e.g. "-min-count 2 -fewest"
+# (options that are not given take their value from the command line). The output of configuration N is written to OUTPUT_PATTERN
+# with {0} replaced by N, and split statistics for each configuration to standard error (or -sweep-stats):
+# hybrid_compound_splitter.py -model MODEL_FILE -sweep CONFIG_FILE -sweep-output OUTPUT_PATTERN < INPUT_FILE
+
 from __future__ import division, unicode_literals
 import sys
 import os
 import re
-import pprint
 import json
 import codecs
 import argparse
-from collections import defaultdict
+import threading
+from collections import defaultdict, deque
 from operator import mul
 
-from lxml import etree as ET
+from wmt14 import fileio
+from wmt14 import cache
+from wmt14 import profiling
+from wmt14 import progress
+from wmt14.lazy import lazy_import
 
-try:
-  import pexpect
-except ImportError:
-  sys.stderr.write('Error: this script requires Pexpect >= 3.0\n')
-  sys.exit(1)
+# fst_wrapper.py is in the emnlp2015 directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emnlp2015'))
+import fst_wrapper
 
-if pexpect.__version__ < 3:
-  sys.stderr.write('Error: this script requires Pexpect >= 3.0. Version {0} found\n'.format(pexpect.__version__))
-  sys.exit(1)
+# only needed for -syntax, and for a local fst-mor process (see import_pexpect())
+ET = lazy_import('lxml.etree')
+pexpect = None
 
 if sys.version_info >= (3, 0):
     from functools import reduce
+    import queue
+else:
+    import Queue as queue
 
 JUNCTURES = ['', 's', 'es', '-'] # only allow  these junctures in unsupervised mode (ignored in hybrid mode)
 SMOR_SPLIT = ['NN', 'NE', 'ADJ'] # only split these word classes with SMOR
@@ -51,40 +62,53 @@ MAX_COUNT = 5
 MAX_SPLIT_HYPOTHESES = 1000 # break if there are too many ways to split a word
 
 SMOR_ENCODING = 'UTF-8'
+SMOR_CACHE_SIZE = 1000000 # maximum number of words whose SMOR segmentations are kept in memory
+SMOR_CACHE_KEEP = 0.75 # fraction of the maximum that is kept when the cache is full (the most frequent words)
+SMOR_TIMEOUT = fst_wrapper.TIMEOUT # seconds to wait for the analysis of a word before fst-mor is restarted and the word is quarantined
+SMOR_MAX_RESTARTS = fst_wrapper.MAX_RESTARTS # give up if fst-mor fails this many times in a row
+SMOR_LOOKAHEAD = 0 # number of lines ahead whose words are analysed by SMOR in a background thread
 
+re_syntax_splitter = re.compile(r'((?:\s*(?:<[^<>]*>)+\s*)|(?:(?<!>)\s+(?!<)))')
 
-class FstWrapper():
-    def __init__(self, smor_binary, smor_model):
-        self.child = pexpect.spawnu(smor_binary + ' ' + smor_model)
-        self.child.delaybeforesend = 0
-        self.child.expect(["analyze> ", pexpect.EOF], timeout=600)
-        before = self.child.before
-        if self.child.terminated:
-            raise RuntimeError(before)
-
-    def analyse(self, word):
-        word = word.strip()
-        if word == "" or word == "q" or word == "\x7f":
-            return []
-        self.child.sendline(word)
-        try:
-            self.child.expect(["analyze> ", pexpect.EOF])
-        except pexpect.TIMEOUT:
-            sys.stderr.write('Warning: timeout while waiting for fst-mor\n')
-            sys.stderr.write('String: {0}'.format(word))
-            return []
-        result = self.child.before.split("\r\n")[1:-1]
-        if len(result) == 1 and re.match("^no result for ", result[0]):
-            result = []
-        return result
 
+def import_pexpect():
+  global pexpect
+  try:
+    import pexpect
+  except ImportError:
+    sys.stderr.write('Error: this script requires Pexpect >= 3.0\n')
+    sys.exit(1)
 
-class SMORSplitter(object):
+  if int(pexpect.__version__.split(".")[0]) < 3:
+    sys.stderr.write('Error: this script requires Pexpect >= 3.0. Version {0} found\n'.format(pexpect.__version__))
+    sys.exit(1)
+
+
+class FstWrapper(fst_wrapper.FstWrapper):
+    """fst_wrapper.FstWrapper (with restarts of fst-mor and quarantine of failing words),
+    which checks the version of pexpect before fst-mor is started"""
+
+    def start(self):
+        import_pexpect()
+        fst_wrapper.FstWrapper.start(self)
 
-    def __init__(self, smor_model, no_truecase):
 
-        self.smor = FstWrapper('fst-mor', smor_model)
-        self.data = defaultdict(set)
+class SMORSplitter(object):
+
+    def __init__(self, smor_model, no_truecase, server=None, cache_size=SMOR_CACHE_SIZE, timeout=SMOR_TIMEOUT, max_restarts=SMOR_MAX_RESTARTS):
+
+        self.smor = FstWrapper('fst-mor', smor_model, server, timeout, max_restarts)
+        # word -> tuple of segmentations; each segmentation is a flat tuple of interned strings (root1, fuge1, root2, fuge2, ...).
+        # words without segmentations (the majority) share the empty tuple.
+        self.data = {}
+        # word -> number of times the word was seen (halved at each eviction)
+        self.counts = {}
+        self.strings = {}
+        self.cache_size = cache_size
+        self.evictions = 0
+        # words looked up by analyze(), and words that were not in the cache
+        self.lookups = 0
+        self.misses = 0
         self.re_mainclass = re.compile(r'<\+(.*?)>')
         self.re_any = re.compile(r'<([^#~-]+?)>')
         self.re_nn = re.compile(r'<#>')
@@ -94,6 +118,13 @@ class SMORSplitter(object):
         self.re_hyphenation = re.compile(r'\{(.+?)\}-(?:<TRUNC>)?')
         self.re_last = re.compile(r'(.+?)<\+',re.UNICODE)
         self.no_truecase = no_truecase
+        # set by start_prefetch(): queue of word lists for the background thread, and its results (word -> SMOR output)
+        self.requests = None
+        self.results = {}
+        # words that were sent to the background thread, and whose results have not been converted yet
+        self.pending = set()
+        self.ready = threading.Condition()
+        self.error = None
 
 
     def convert(self, analyses):
@@ -142,6 +173,7 @@ class SMORSplitter(object):
 
 
     def get_best(self,cache):
+        segmentations = []
         if cache:
             for best in cache: #currently, process all segmentations. possible modification: only use 'best' segmentation, i.e. the one with the fewest morphemes
 
@@ -180,7 +212,82 @@ class SMORSplitter(object):
                         root = self.re_morph.sub('', root)
                         split[i] = (root, fuge)
 
-                    self.data[best[0]].add(tuple(split))
+                    split = tuple(self.intern(item) for pair in split for item in pair)
+                    if split not in segmentations:
+                        segmentations.append(split)
+
+            if segmentations:
+                self.data[cache[0][0]] = tuple(segmentations)
+
+
+    def intern(self, string):
+        return self.strings.setdefault(string, string)
+
+
+    def splits(self, word):
+        """yield the segmentations of word (lists of (root, fuge) pairs), starting with the unsplit word"""
+
+        if word not in self.data:
+            # evicted since it was analysed
+            self.analyze([word])
+
+        yield [(word, '')]
+        for split in self.data[word]:
+            yield list(zip(split[::2], split[1::2]))
+
+
+    def evict(self, protect=()):
+        """if the cache is full, keep only the most frequent words (and the words in protect)"""
+
+        if len(self.data) <= self.cache_size:
+            return
+
+        size = len(self.data)
+        keep = sorted(self.counts, key=self.counts.get, reverse=True)[:int(self.cache_size*SMOR_CACHE_KEEP)]
+        keep = set(keep).union(word for word in protect if word in self.data)
+
+        # rebuilding the dictionaries releases their memory; halving the counts lets new frequent words catch up
+        self.data = dict((word, self.data[word]) for word in keep)
+        self.counts = dict((word, (self.counts[word]+1)//2) for word in keep)
+        self.strings = dict((string, string) for segmentations in self.data.values() for split in segmentations for string in split)
+        self.evictions += size - len(self.data)
+
+
+    def report(self, file_obj, cache_stats=True):
+        """write the statistics of the cache (if cache_stats), and the restarts of fst-mor and the quarantined words"""
+        if cache_stats:
+            stats = self.get_stats()
+            file_obj.write('SMOR cache: {0} words, {1} segmentations, {2} strings, {3:.1f} MB, {4} evicted\n'.format(
+                stats['words'], stats['segmentations'], stats['strings'], stats['bytes']/1024/1024, stats['evictions']))
+        if self.smor.server is None and (self.smor.restarts or self.smor.quarantine):
+            file_obj.write('fst-mor: {0} restarts, {1} quarantined words: {2}\n'.format(
+                self.smor.restarts, len(self.smor.quarantine), ' '.join(sorted(self.smor.quarantine))))
+
+
+    def get_stats(self):
+        """return statistics of the cache, including its (approximate) size in memory"""
+
+        size = sys.getsizeof(self.data) + sys.getsizeof(self.counts) + sys.getsizeof(self.strings)
+        segmentations = 0
+        for word, value in self.data.items():
+            size += sys.getsizeof(word)
+            if value:
+                size += sys.getsizeof(value) + sum(sys.getsizeof(split) for split in value)
+                segmentations += len(value)
+        size += sum(sys.getsizeof(string) for string in self.strings)
+
+        return {'words': len(self.data), 'segmentations': segmentations, 'strings': len(self.strings),
+                'bytes': size, 'evictions': self.evictions}
+
+
+    def get_progress(self):
+        """return the statistics for progress reports (cheap enough to be called while the cache is in use)"""
+
+        stats = {'words': len(self.data),
+                 'hit_rate': 100*(self.lookups-self.misses)/self.lookups if self.lookups else 0}
+        if self.smor.server is None:
+            stats.update(progress.percentiles(self.smor.latencies))
+        return stats
 
 
     def analyze(self, words_in):
@@ -188,16 +295,110 @@ class SMORSplitter(object):
 
         todo = []
 
+        self.evict(words_in)
+
         for word in words_in:
+            self.counts[word] = self.counts.get(word, 0) + 1
             if not word in self.data:
 
-                self.data[word] = set([((word,''),)])
+                self.data[word] = ()
                 todo.append(word)
 
-        analyses = [(word, self.smor.analyse(word)) for word in todo]
+        self.lookups += len(words_in)
+        self.misses += len(todo)
+
+        if self.requests is None:
+            analyses = [(word, self.smor.analyse(word)) for word in todo]
+        else:
+            analyses = self.collect(todo)
         self.convert(analyses)
 
 
+    def start_prefetch(self):
+        """start a background thread that analyses the words given to prefetch(). While it runs, fst-mor is only used by this thread."""
+
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.prefetch_worker)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def stop_prefetch(self):
+
+        self.requests.put(None)
+        self.thread.join()
+        self.requests = None
+        self.results = {}
+        self.pending = set()
+
+
+    def prefetch_worker(self):
+
+        while True:
+            words = self.requests.get()
+            if words is None:
+                return
+            try:
+                analyses = self.smor.analyse_batch(words)
+            except Exception as e:
+                with self.ready:
+                    self.error = e
+                    self.ready.notify()
+                return
+            with self.ready:
+                self.results.update(zip(words, analyses))
+                self.ready.notify()
+
+
+    def prefetch(self, words):
+        """send the words that are not in the cache to the background thread"""
+
+        todo = []
+        for word in words:
+            if word not in self.data and word not in self.pending:
+                self.pending.add(word)
+                todo.append(word)
+        if todo:
+            self.requests.put(todo)
+
+
+    def collect(self, words):
+        """return (word, SMOR output) for a list of words, waiting for the background thread if necessary.
+        Analyses are only added to the cache here, so prefetched words cannot be evicted before they are used."""
+
+        todo = [word for word in words if word not in self.pending]
+        if todo:
+            self.pending.update(todo)
+            self.requests.put(todo)
+        with self.ready:
+            while self.error is None and not all(word in self.results for word in words):
+                self.ready.wait()
+            if self.error is not None:
+                raise self.error
+            analyses = [(word, self.results.pop(word)) for word in words]
+        self.pending.difference_update(words)
+        return analyses
+
+
+    def prefetch_lines(self, lines, depth, syntax, line_cache=None):
+        """yield lines; while a line is processed, the words of the next depth lines are analysed in the background.
+        Lines that are in line_cache, or that are repeated within the lookahead, are not analysed again."""
+
+        self.start_prefetch()
+        window = deque()
+        try:
+            for line in lines:
+                if line not in window and not (line_cache is not None and line in line_cache):
+                    self.prefetch(tokenize(line, syntax)[2])
+                window.append(line)
+                if len(window) > depth:
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+        finally:
+            self.stop_prefetch()
+
+
 
 def train_model(in_obj, out_path, syntax):
 
@@ -248,10 +449,10 @@ def generate_decompositions(splits, memory = False, write_juncture = False):
                 yield decomposition
 
 
-def get_unsupervised_splits(word, freq, truecase, fst_server=None, write_juncture=False, no_truecase=False):
+def get_unsupervised_splits(word, freq, truecase, fst_server, write_juncture, no_truecase, min_size, min_count):
     reachable = [{} for i in range(len(word)+1)]
-    for end in range(MIN_SIZE, len(word)+1):
-        for start in range(0, end-MIN_SIZE+1):
+    for end in range(min_size, len(word)+1):
+        for start in range(0, end-min_size+1):
 
             if start and not reachable[start]: # no split ending in this position
                 continue
@@ -266,7 +467,7 @@ def get_unsupervised_splits(word, freq, truecase, fst_server=None, write_junctur
 
                 subword_orig = word[start+len(juncture):end]
                 subword = subword_orig.lower()
-                if subword not in freq or freq[subword] < MIN_COUNT:
+                if subword not in freq or freq[subword] < min_count:
                     continue
 
                 if VERBOSE:
@@ -294,7 +495,7 @@ def get_unsupervised_splits(word, freq, truecase, fst_server=None, write_junctur
     for decomposition in generate_decompositions(reachable, write_juncture = write_juncture):
         yield decomposition
 
-def join_compounds(compounds, freq, truecase, write_junctures, no_truecase, memory = False):
+def join_compounds(compounds, freq, truecase, write_junctures, no_truecase, min_count, memory = False):
 
     if not memory:
         memory = []
@@ -310,7 +511,7 @@ def join_compounds(compounds, freq, truecase, write_junctures, no_truecase, memo
             subword_orig = prefix + suffix
             subword = subword_orig.lower()
 
-        if subword not in freq or freq[subword] < MIN_COUNT:
+        if subword not in freq or freq[subword] < min_count:
             continue
 
         if VERBOSE:
@@ -330,14 +531,15 @@ def join_compounds(compounds, freq, truecase, write_junctures, no_truecase, memo
         else:
             if write_junctures:
                 new_element.append(('@' + compounds[j-1][1] + '@', -1))
-            for compound in join_compounds(compounds[j:], freq, truecase, write_junctures, no_truecase, memory + new_element):
+            for compound in join_compounds(compounds[j:], freq, truecase, write_junctures, no_truecase, min_count, memory + new_element):
                 yield compound
 
 
-def get_FST_splits(word, freq, truecase, fst_server, write_junctures, no_truecase):
+def get_FST_splits(word, freq, truecase, fst_server, write_junctures, no_truecase, min_size, min_count):
 
-    for split in fst_server.data[word]:
-        for compound in join_compounds(split, freq, truecase, write_junctures, no_truecase):
+    # min_size does not apply to the segments found by SMOR
+    for split in fst_server.splits(word):
+        for compound in join_compounds(split, freq, truecase, write_junctures, no_truecase, min_count):
             yield compound
 
 
@@ -394,9 +596,9 @@ def create_compound_xml(element, wordlist, write_junctures, merge_junctures, dep
             head.append(dep2)
 
 
-def apply_model(file_obj, freq, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency):
+def get_truecase(freq, no_truecase):
+    """add lowercased words to the frequency model, and return a mapping from lowercased words to their most frequent spelling"""
 
-    re_syntax_splitter = re.compile(r'((?:\s*(?:<[^<>]*>)+\s*)|(?:(?<!>)\s+(?!<)))')
     truecase = {}
 
     for word in list(freq):
@@ -408,92 +610,293 @@ def apply_model(file_obj, freq, fst_server, split_function, write_junctures, mer
         if word_lc != word and not no_truecase:
             truecase[word_lc] = word
 
-    for line in file_obj:
+    return truecase
 
-        # only do syntactic processing if option syntax is used and we see '<' in line
-        write_syntax = syntax
-        if write_syntax and not '<' in line:
-            write_syntax = False
 
-        if write_syntax:
-            words_in = re_syntax_splitter.split(line)
-            words_in_clean = [word for word in words_in if word and not word.startswith('<') and not word == ' ']
-        else:
-            words_in = line.split()
-            words_in_clean = words_in
+def get_candidates(word, freq, truecase, fst_server, split_function, write_juncture, no_truecase, min_size, min_count):
+    """return the possible decompositions of word (at most MAX_SPLIT_HYPOTHESES), as a list of
+    (split, number of scored segments, geometric mean of segment frequencies)"""
 
-        if fst_server:
-            fst_server.analyze(words_in_clean)
+    candidates = []
+    for i, decomposition in enumerate(split_function(word, freq, truecase, fst_server, write_juncture, no_truecase, min_size, min_count)):
 
-        words = []
-        for word in words_in:
+        if i >= MAX_SPLIT_HYPOTHESES:
+            break
 
-            if write_syntax:
-                if not word:
-                    continue
-                if word == ' ' or word.startswith('<'):
+        split_list, scores = zip(*decomposition)
+        scores = [score for score in scores if score != -1] #ignoring
+        total = reduce(mul, scores)
+        score = total ** (1/len(scores))
+        split = ' '.join(split_list)
+
+        if VERBOSE:
+            sys.stderr.write('\t split: {0} ({1} ** 1/{2}) = {3}\n'.format(split, total, len(scores), score))
+
+        candidates.append((split, len(scores), score))
+
+    return candidates
+
+
+def choose_split(word, candidates, fewest):
+    """return the best split among the candidates, or word if no split scores higher than the unsplit word.
+    With fewest, the candidate with the fewest segments is preferred. The unsplit word is itself a candidate (with one segment)
+    if its frequency meets min_count (and its length min_size), so with fewest, a word is only split if it is rarer than that."""
+
+    best_split = word
+    best_score = None if fewest else 1
+
+    for split, length, score in candidates:
+        if fewest:
+            score = (-length, score)
+        if best_score is None or score > best_score:
+            best_split = split
+            best_score = score
+
+    return best_split
+
+
+def render_split(best_split, write_syntax, write_junctures, merge_junctures, dependency):
+    """return the output for a split word (a tree fragment in Moses XML format with write_syntax)"""
+
+    if write_syntax and len(best_split.split()) > 1:
+        head = ET.Element('x')
+        create_compound_xml(head, best_split.split(), write_junctures, merge_junctures, dependency, initial=True)
+        best_split = ET.tostring(head, encoding="UTF-8")[3:-4].decode("UTF-8")
+        if dependency:
+            best_split = best_split.rsplit('<',1)[0]
+
+    if merge_junctures:
+        merged_best_split = []
+        for item in best_split.split():
+            if merged_best_split and len(item) > 1 and item[0] == item[-1] == "@":
+                merged_best_split[-1] += item[1:-1] + "@@"
+            else:
+                merged_best_split.append(item)
+        best_split = ' '.join(merged_best_split)
+
+    return best_split
+
+
+def tokenize(line, syntax):
+    """return whether line is processed as syntax, its tokens (including markup and whitespace with syntax), and its words"""
+
+    # only do syntactic processing if option syntax is used and we see '<' in line
+    write_syntax = syntax
+    if write_syntax and not '<' in line:
+        write_syntax = False
+
+    if write_syntax:
+        words_in = re_syntax_splitter.split(line)
+        words_in_clean = [word for word in words_in if word and not word.startswith('<') and not word == ' ']
+    else:
+        words_in = line.split()
+        words_in_clean = words_in
+
+    return write_syntax, words_in, words_in_clean
+
+
+def split_line_configs(line, configs, freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency, stats=None):
+    """split the compounds in one line of input with each configuration (a tuple of min_size, min_count, max_count, fewest),
+    and return the list of output lines. Tokenization, SMOR analyses and the split candidates of each word are shared
+    between configurations. If stats is given, the numbers of words, split words and segments of split words are added to
+    the list for each configuration."""
+
+    write_syntax, words_in, words_in_clean = tokenize(line, syntax)
+
+    if fst_server:
+        fst_server.analyze(words_in_clean)
+
+    outputs = [[] for config in configs]
+    for word in words_in:
+
+        if write_syntax:
+            if not word:
+                continue
+            if word == ' ' or word.startswith('<'):
+                for words in outputs:
                     words.append(word)
-                    continue
+                continue
+
+        word_lc = word.lower()
+        if VERBOSE:
+            sys.stderr.write('considering {0} ({1})...\n'.format(word, word_lc))
 
-            word_lc = word.lower()
-            if VERBOSE:
-                sys.stderr.write('considering {0} ({1})...\n'.format(word, word_lc))
+        # (min_size, min_count) -> candidates; best split -> output
+        candidates = {}
+        rendered = {}
 
-            if word_lc in freq and freq[word_lc] >= MAX_COUNT:
+        for i, (min_size, min_count, max_count, fewest) in enumerate(configs):
+            words = outputs[i]
+            if stats is not None:
+                stats[i][0] += 1
+
+            if word_lc in freq and freq[word_lc] >= max_count:
                 words.append(word)
                 if VERBOSE:
-                    sys.stderr.write('\tfrequent word ({0}>{1}), skipping\n'.format(freq[word_lc], MAX_COUNT))
+                    sys.stderr.write('\tfrequent word ({0}>{1}), skipping\n'.format(freq[word_lc], max_count))
                 continue
 
-            best_split = word
-            best_score = 1
+            if (min_size, min_count) not in candidates:
+                candidates[(min_size, min_count)] = get_candidates(word, freq, truecase, fst_server, split_function, write_junctures or merge_junctures, no_truecase, min_size, min_count)
 
-            for i, decomposition in enumerate(split_function(word, freq, truecase, fst_server, write_junctures or merge_junctures, no_truecase)):
+            best_split = choose_split(word, candidates[(min_size, min_count)], fewest)
+            segments = len(best_split.split())
 
-                if i >= MAX_SPLIT_HYPOTHESES:
-                    break
+            if stats is not None and segments > 1:
+                stats[i][1] += 1
+                # filler elements (with -write-filler) are not counted
+                stats[i][2] += len([item for item in best_split.split() if not (len(item) > 1 and item[0] == item[-1] == '@')])
 
-                split_list, scores = zip(*decomposition)
-                scores = [score for score in scores if score != -1] #ignoring
-                total = reduce(mul, scores)
-                score = total ** (1/len(scores))
-                if FEWEST:
-                    score = (-len(scores),score)
-                split = ' '.join(split_list)
+            if write_syntax and dependency and segments > 1:
+                words[-1] = words[-1].rsplit('<',1)[0]
 
-                if VERBOSE:
-                    sys.stderr.write('\t split: {0} ({1} ** 1/{2}) = {3}\n'.format(split, total, len(scores), score))
-
-                if score > best_score:
-                    best_split = split
-                    best_score = score
-
-            if write_syntax and len(best_split.split()) > 1:
-                head = ET.Element('x')
-                create_compound_xml(head, best_split.split(), write_junctures, merge_junctures, dependency, initial=True)
-                best_split = ET.tostring(head, encoding="UTF-8")[3:-4].decode("UTF-8")
-                if dependency:
-                    words[-1] = words[-1].rsplit('<',1)[0]
-                    best_split = best_split.rsplit('<',1)[0]
-
-            if merge_junctures:
-                merged_best_split = []
-                for item in best_split.split():
-                    if merged_best_split and len(item) > 1 and item[0] == item[-1] == "@":
-                        merged_best_split[-1] += item[1:-1] + "@@"
-                    else:
-                        merged_best_split.append(item)
-                best_split = ' '.join(merged_best_split)
+            if best_split not in rendered:
+                rendered[best_split] = render_split(best_split, write_syntax, write_junctures, merge_junctures, dependency)
+            words.append(rendered[best_split])
 
-            words.append(best_split)
+    if write_syntax:
+        return [''.join(words) for words in outputs]
+    else:
+        return [' '.join(words) + '\n' for words in outputs]
 
-        if write_syntax:
-            sys.stdout.write(''.join(words))
+
+def split_line(line, freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency):
+    """split the compounds in one line of input, and return the output line"""
+
+    config = (MIN_SIZE, MIN_COUNT, MAX_COUNT, FEWEST)
+    return split_line_configs(line, [config], freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency)[0]
+
+
+def apply_model(file_obj, freq, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency, line_cache=None, lookahead=SMOR_LOOKAHEAD, progress_obj=None):
+
+    truecase = get_truecase(freq, no_truecase)
+
+    if fst_server and lookahead > 0:
+        file_obj = fst_server.prefetch_lines(file_obj, lookahead, syntax, line_cache)
+
+    if progress_obj is not None:
+        file_obj = progress_obj.count_lines(file_obj)
+
+    for line in file_obj:
+        if line_cache is not None:
+            output = line_cache.get(line)
+            if output is None:
+                output = split_line(line, freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency)
+                line_cache.put(line, output)
         else:
-            sys.stdout.write(' '.join(words) + '\n')
+            output = split_line(line, freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency)
+        sys.stdout.write(output)
 
 
-def parse_arguments():
+def read_sweep_configs(file_obj, args):
+    """read configurations for a sweep (one line of options per configuration), and return a list of
+    (options, (min_size, min_count, max_count, fewest)). Options that are not given take their value from args."""
+
+    parser = argparse.ArgumentParser(prog='-sweep', add_help=False)
+    parser.add_argument('-min-size', type=int, default=args.min_size)
+    parser.add_argument('-min-count', type=int, default=args.min_count)
+    parser.add_argument('-max-count', type=int, default=args.max_count)
+    parser.add_argument('-fewest', action="store_true", default=args.fewest)
+
+    configs = []
+    for line in file_obj:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        config = parser.parse_args(line.split())
+        configs.append((line, (config.min_size, config.min_count, config.max_count, config.fewest)))
+
+    return configs
+
+
+def sweep(file_obj, configs, output_pattern, freq, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency, lookahead=SMOR_LOOKAHEAD, progress_obj=None):
+    """apply several configurations (from read_sweep_configs()) in one pass over the input; write the output of configuration N
+    to output_pattern.format(N), and return the statistics of each configuration (words, split words, segments of split words)"""
+
+    truecase = get_truecase(freq, no_truecase)
+
+    out_objs = [fileio.open_output(output_pattern.format(i+1), 'UTF-8') for i in range(len(configs))]
+    stats = [[0, 0, 0] for config in configs]
+    options = [config for name, config in configs]
+
+    if fst_server and lookahead > 0:
+        file_obj = fst_server.prefetch_lines(file_obj, lookahead, syntax)
+
+    if progress_obj is not None:
+        file_obj = progress_obj.count_lines(file_obj)
+
+    for line in file_obj:
+        outputs = split_line_configs(line, options, freq, truecase, fst_server, split_function, write_junctures, merge_junctures, syntax, no_truecase, dependency, stats)
+        for out_obj, output in zip(out_objs, outputs):
+            out_obj.write(output)
+
+    for out_obj in out_objs:
+        out_obj.close()
+
+    return stats
+
+
+def write_sweep_stats(file_obj, configs, stats, output_pattern):
+
+    file_obj.write('config\toutput\twords\tsplit_words\tsplit_rate\tsegments_per_split\toptions\n')
+    for i, ((name, config), (words, split_words, segments)) in enumerate(zip(configs, stats)):
+        file_obj.write('{0}\t{1}\t{2}\t{3}\t{4:.4f}\t{5:.3f}\t{6}\n'.format(
+            i+1, output_pattern.format(i+1), words, split_words, split_words/words if words else 0,
+            segments/split_words if split_words else 0, name))
+
+
+def cache_options(args):
+    """return the options that affect the output of split_line(), as a string (part of the key of the result cache).
+    The model and SMOR transducer are identified by their path, size and modification time."""
+
+    options = []
+    for path in args.model, args.smor:
+        if path is not None and os.path.exists(path):
+            stat = os.stat(path)
+            options.append('{0}:{1}:{2}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime))
+        else:
+            options.append(str(path))
+    for name in 'min_size', 'min_count', 'max_count', 'fewest', 'write_junctures', 'merge_junctures', 'syntax', 'no_truecase', 'dependency':
+        options.append('{0}={1}'.format(name, getattr(args, name)))
+    return ' '.join(options)
+
+
+def load_model(args):
+    """load the frequency model (a JSON file or, with -module, a Python module)"""
+
+    if args.module:
+        if args.model.endswith('.py'):
+            args.model = args.model[:-3]
+        model = __import__(args.model)
+
+    else:
+        if sys.version_info < (3, 0):
+            file_obj = codecs.getreader('UTF-8')(open(args.model, 'r'))
+        else:
+            file_obj = open(args.model, 'r', encoding='UTF-8')
+        start = file_obj.read(100)
+        offset = start.find('{')
+        file_obj.seek(offset)
+        model = {}
+        model['model'] = json.load(file_obj)
+        model = argparse.Namespace(**model)
+
+    return model.model
+
+
+def set_options(args):
+    """set the global options of the splitter from the command line arguments"""
+
+    global VERBOSE, MIN_SIZE, MIN_COUNT, MAX_COUNT, FEWEST
+
+    VERBOSE = not args.q
+    MIN_SIZE = args.min_size
+    MIN_COUNT = args.min_count
+    MAX_COUNT = args.max_count
+    FEWEST = args.fewest
+
+
+def get_parser():
 
     help_text =  "compound splitter\n"
     help_text += "  train: python hybrid_compound_splitter.py -train -corpus txt-file -model new-model\n"
@@ -505,14 +908,30 @@ def parse_arguments():
 
     general.add_argument('-model', metavar='MODEL', required=True,
                     help='path to statistical decompounding model. Will be overwritten if -train is active.')
-    general.add_argument('-corpus', type=argparse.FileType('r'), default=sys.stdin, metavar='PATH',
-                    help='input text (default: standard input).')
+    general.add_argument('-corpus', metavar='PATH',
+                    help='input text (default: standard input). May be compressed (gzip, xz, zstd).')
+    general.add_argument('-output', metavar='PATH',
+                    help='output text (default: standard output). Compressed if PATH ends in .gz, .xz or .zst.')
     general.add_argument('-train', action="store_true",
                     help='train model on input text. MODEL will be overwritten.')
     general.add_argument('-syntax', action="store_true",
                     help='input/output is syntactic tree')
     general.add_argument('-q', action="store_true",
                     help='quiet mode.')
+    general.add_argument('-sweep', metavar='CONFIG_FILE',
+                    help='apply several configurations of -min-size, -min-count, -max-count and -fewest (one per line of CONFIG_FILE) in one pass.')
+    general.add_argument('-sweep-output', metavar='PATTERN', default='sweep.{0}',
+                    help='output file of each configuration of -sweep; {0} is replaced by the number of the configuration (default: %(default)s).')
+    general.add_argument('-sweep-stats', metavar='PATH',
+                    help='file for the split statistics of each configuration of -sweep (default: standard error).')
+    general.add_argument('-cache-size', type=int, metavar='N',
+                    help='number of results for distinct lines that are kept in memory (default: {0} with -cache-file, otherwise no cache)'.format(cache.CACHE_SIZE))
+    general.add_argument('-cache-file', metavar='PATH',
+                    help='SQLite database in which results are kept across runs')
+    general.add_argument('-progress', type=float, metavar='SECONDS',
+                    help='write the number of processed lines, the rate, the ETA and cache statistics to standard error every SECONDS seconds')
+    general.add_argument('-progress-file', metavar='PATH',
+                    help='write the progress (in JSON format) to PATH instead of standard error (every {0} seconds by default)'.format(progress.INTERVAL))
 
     application = parser.add_argument_group('application options')
 
@@ -523,11 +942,22 @@ def parse_arguments():
     application.add_argument('-max-count', type=int,
                     help='maximum word count [don\'t split up frequent words] (default {0})'.format(MAX_COUNT), default=MAX_COUNT)
     application.add_argument('-fewest', action="store_true",
-                    help='prefer option with fewest splits (that meets all other constraints)')
+                    help='prefer option with fewest splits (that meets all other constraints). '
+                         'The unsplit word is one of the options if it meets -min-count, so only words rarer than that are split.')
     application.add_argument('-module', action="store_true",
                     help='load model as Python module - quicker, but model file needs to end in *.py and be in same folder as script.')
     application.add_argument('-smor', metavar='PATH',
                     help='perform hybrid compound splitting (with SMOR morphology). Default: purely corpus-based compound splitting.')
+    application.add_argument('-smor-cache-size', type=int, default=SMOR_CACHE_SIZE, metavar='N',
+                    help='maximum number of words whose SMOR analyses are kept in memory; the most frequent words are kept (default: %(default)s).')
+    application.add_argument('-smor-server', metavar='SOCKET',
+                    help='get SMOR analyses from a running smor_server.py (default: value of environment variable SMOR_SERVER, if set).')
+    application.add_argument('-smor-timeout', type=float, default=SMOR_TIMEOUT, metavar='SECONDS',
+                    help='maximum time for the analysis of one word; fst-mor is then restarted, and the word is quarantined (left unsplit) (default: %(default)s). Not used with -smor-server (see the option --timeout of smor_server.py).')
+    application.add_argument('-smor-restarts', type=int, default=SMOR_MAX_RESTARTS, metavar='N',
+                    help='give up if fst-mor crashes or hangs this many times in a row (default: %(default)s). Not used with -smor-server (see the option --max-restarts of smor_server.py).')
+    application.add_argument('-smor-lookahead', type=int, default=SMOR_LOOKAHEAD, metavar='N',
+                    help='analyse the words of the next N lines with SMOR in a background thread while the current line is split (default: %(default)s).')
     application.add_argument('-no-truecase', action='store_true',
                     help='leave segments in original case')
     application.add_argument('-dependency', action='store_true',
@@ -540,52 +970,90 @@ def parse_arguments():
     filler.add_argument('-merge-filler', action="store_true", dest='merge_junctures',
                     help='write filler elements (concatenated with preceding segment, ending in @@)')
 
-    args = parser.parse_args()
+    return parser
+
+
+def parse_arguments():
+
+    args = get_parser().parse_args()
 
     return args
 
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('parse', tokenize)
+profiling.register('serialize', render_split)
+profiling.register('smor_wait', FstWrapper.send, SMORSplitter.collect)
+
+
 if __name__ == '__main__':
 
+    profiling.start_from_environment()
+
     args = parse_arguments()
 
-    VERBOSE = not args.q
-    MIN_SIZE = args.min_size
-    MIN_COUNT = args.min_count
-    MAX_COUNT = args.max_count
-    FEWEST = args.fewest
+    set_options(args)
+
+    args.corpus = fileio.open_input(args.corpus, 'UTF-8')
 
     if sys.version_info < (3, 0):
-        sys.stdout = codecs.getwriter('UTF-8')(sys.stdout)
-        args.corpus = codecs.getreader('UTF-8')(args.corpus)
         sys.stderr = codecs.getwriter('UTF-8')(sys.stderr)
 
+    if not args.train and not args.sweep:
+        sys.stdout = fileio.open_output(args.output, 'UTF-8')
+
     if args.train:
         train_model(args.corpus, args.model, args.syntax)
 
     else:
-        if args.module:
-            if args.model.endswith('.py'):
-                args.model = args.model[:-3]
-            model = __import__(args.model)
-
-        else:
-            if sys.version_info < (3, 0):
-                file_obj = codecs.getreader('UTF-8')(open(args.model, 'r'))
-            else:
-                file_obj = open(args.model, 'r', encoding='UTF-8')
-            start = file_obj.read(100)
-            offset = start.find('{')
-            file_obj.seek(offset)
-            model = {}
-            model['model'] = json.load(file_obj)
-            model = argparse.Namespace(**model)
+        model = load_model(args)
 
         if args.smor:
-            smor_server = SMORSplitter(args.smor, args.no_truecase)
+            smor_server = SMORSplitter(args.smor, args.no_truecase, args.smor_server, args.smor_cache_size,
+                                       args.smor_timeout, args.smor_restarts)
             split_function = get_FST_splits
         else:
             smor_server = None
             split_function = get_unsupervised_splits
 
+        progress_obj = progress.create(args.progress, args.progress_file)
+        if progress_obj is not None:
+            progress_obj.track_input(args.corpus)
+            if smor_server:
+                progress_obj.add_source('SMOR', smor_server.get_progress)
+            progress_obj.start()
+
+
+        if args.sweep:
+            with open(args.sweep) as config_file:
+                configs = read_sweep_configs(config_file, args)
+            stats = sweep(args.corpus, configs, args.sweep_output, model, smor_server, split_function, args.write_junctures, args.merge_junctures, args.syntax, args.no_truecase, args.dependency, args.smor_lookahead, progress_obj)
+            if progress_obj is not None:
+                progress_obj.stop()
+            if args.sweep_stats:
+                stats_obj = fileio.open_output(args.sweep_stats, 'UTF-8')
+            else:
+                stats_obj = sys.stderr
+            write_sweep_stats(stats_obj, configs, stats, args.sweep_output)
+            if args.sweep_stats:
+                stats_obj.close()
+            if smor_server:
+                smor_server.report(sys.stderr, not args.q)
+            sys.exit(0)
+
+        line_cache = cache.create('split', cache_options(args), args.cache_size, args.cache_file)
+
+        if progress_obj is not None and line_cache is not None:
+            progress_obj.add_source('cache', line_cache.get_stats)
+
+        apply_model(args.corpus, model, smor_server, split_function, args.write_junctures, args.merge_junctures, args.syntax, args.no_truecase, args.dependency, line_cache, args.smor_lookahead, progress_obj)
+
+        if progress_obj is not None:
+            progress_obj.stop()
+
+        if line_cache is not None:
+            line_cache.close()
+            line_cache.report()
 
-        apply_model(args.corpus, model.model, smor_server, split_function, args.write_junctures, args.merge_junctures, args.syntax, args.no_truecase, args.dependency)
+        if smor_server:
+            smor_server.report(sys.stderr, not args.q)
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# parse tokenized German text with several ParZu processes in parallel, and apply the label set modifications
+# of enrich_labelset.py to the output. This replaces the following part of the 'output-parser' step in the EMS configs:
+#
+#   $parzu-path/parzu -i tokenized_lines --projective | $wmt2014-scripts/enrich_labelset.py --wmt15
+#
+# with:
+#
+#   $wmt2014-scripts/parallel_parzu.py -j 8 --parser "$parzu-path/parzu -i tokenized_lines --projective" --wmt15
+#
+# The input is split into chunks of lines; each chunk is parsed by a separate parser process, and the output (in CoNLL format)
+# is written in the original order. All options not listed below are passed on to enrich_labelset.py.
+
+from __future__ import print_function, unicode_literals
+import os
+import sys
+import time
+import signal
+import argparse
+import threading
+import subprocess
+from collections import defaultdict, deque
+from multiprocessing.pool import ThreadPool
+
+import enrich_labelset
+from wmt14 import fileio
+from wmt14 import profiling
+
+PARSER = 'parzu -i tokenized_lines --projective'
+CHUNK_SIZE = 1000
+RETRIES = 3
+
+
+def read_chunks(file_obj, chunk_size):
+    """split input into chunks of (at most) chunk_size non-empty lines"""
+    chunk = []
+    for line in file_obj:
+        # the parser produces no output for empty lines
+        if not line.strip():
+            continue
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def count_sentences(conll):
+    """count the sentences in parser output (in CoNLL format, with an empty line after each sentence)"""
+    sentences = 0
+    in_sentence = False
+    for line in conll.splitlines():
+        if line.strip():
+            in_sentence = True
+        elif in_sentence:
+            sentences += 1
+            in_sentence = False
+    if in_sentence:
+        sentences += 1
+    return sentences
+
+
+class ParserPool(object):
+    """run a parser command on chunks of input, with at most 'jobs' parser processes at a time"""
+
+    def __init__(self, command, jobs, retries):
+        self.command = command
+        self.jobs = jobs
+        self.retries = retries
+        self.pool = ThreadPool(jobs)
+        self.lock = threading.Lock()
+        # running parser processes, which are killed by terminate()
+        self.processes = set()
+        self.terminated = False
+        # per-worker statistics: sentences, seconds spent parsing, restarts of failed parser processes
+        self.stats = defaultdict(lambda: [0, 0.0, 0])
+
+    def parse(self, chunk):
+        """parse one chunk of input. If the parser process dies or returns a wrong number of sentences, it is restarted."""
+
+        worker = threading.current_thread().name
+        data = b''.join(chunk)
+
+        for attempt in range(self.retries + 1):
+            start = time.time()
+            with self.lock:
+                if self.terminated:
+                    raise RuntimeError('parser pool was terminated')
+                # in a new session, so that terminate() can kill the shell and all processes started by the parser command
+                parser = subprocess.Popen(self.command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, preexec_fn=os.setsid)
+                self.processes.add(parser)
+            try:
+                output = parser.communicate(data)[0]
+            finally:
+                with self.lock:
+                    self.processes.discard(parser)
+            if self.terminated:
+                raise RuntimeError('parser pool was terminated')
+            elapsed = time.time() - start
+
+            if parser.returncode == 0:
+                sentences = count_sentences(output)
+                if sentences == len(chunk):
+                    with self.lock:
+                        self.stats[worker][0] += sentences
+                        self.stats[worker][1] += elapsed
+                    return output
+                problem = 'expected {0} sentences, got {1}'.format(len(chunk), sentences)
+            else:
+                problem = 'exit status {0}'.format(parser.returncode)
+
+            with self.lock:
+                self.stats[worker][1] += elapsed
+                self.stats[worker][2] += 1
+            sys.stderr.write('Warning: parser process in {0} failed ({1}); attempt {2} of {3}\n'.format(worker, problem, attempt+1, self.retries+1))
+
+        raise RuntimeError('parser failed {0} times on the same chunk of input; giving up'.format(self.retries + 1))
+
+    def imap(self, chunks):
+        """parse chunks in parallel, and yield the parser output in the original order.
+        At most 2*jobs chunks are kept in memory at a time."""
+
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(self.pool.apply_async(self.parse, (chunk,)))
+                if len(pending) >= 2*self.jobs:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+            self.pool.close()
+            self.pool.join()
+        finally:
+            # if a chunk failed (or the output is not read to the end), do not leave parser processes running
+            self.terminate()
+
+    def terminate(self):
+        """kill all running parser processes, and stop the worker threads"""
+        with self.lock:
+            self.terminated = True
+            for parser in self.processes:
+                try:
+                    os.killpg(parser.pid, signal.SIGKILL)
+                except OSError:
+                    # already finished
+                    pass
+        self.pool.terminate()
+
+    def report(self, file_obj):
+        for worker in sorted(self.stats):
+            sentences, seconds, restarts = self.stats[worker]
+            file_obj.write('{0}: {1} sentences in {2:.1f}s ({3:.2f} sentences/s), {4} restarts\n'.format(
+                worker, sentences, seconds, sentences/seconds if seconds else 0, restarts))
+
+
+def parsed_lines(pool, chunks):
+    """yield lines of parser output, in the order of the input"""
+    for output in pool.imap(chunks):
+        for line in output.splitlines(True):
+            yield line
+
+
+def parse_arguments():
+
+    help_text = "parse text with several ParZu processes in parallel, and modify the label set with enrich_labelset.py.\n"
+    help_text += "unknown options (such as --wmt14 or --wmt15) are passed on to enrich_labelset.py.\n"
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=help_text)
+
+    parser.add_argument('-j', '--jobs', type=int, default=4, metavar='N',
+                    help='number of parser processes that run in parallel (default: %(default)s)')
+    parser.add_argument('--parser', default=PARSER, metavar='COMMAND',
+                    help='parser command; reads tokenized sentences (one per line) on stdin, and writes CoNLL to stdout (default: "%(default)s")')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, metavar='LINES',
+                    help='number of lines sent to each parser process (default: %(default)s)')
+    parser.add_argument('--retries', type=int, default=RETRIES,
+                    help='how often a chunk is retried if the parser process fails (default: %(default)s)')
+    parser.add_argument('--input', metavar='PATH',
+                    help='tokenized input text (default: standard input). May be compressed (gzip, xz, zstd).')
+    parser.add_argument('--output', metavar='PATH',
+                    help='output file (default: standard output). Compressed if PATH ends in .gz, .xz or .zst.')
+    parser.add_argument('--no-enrich', action='store_true',
+                    help='write parser output without label set modifications')
+    parser.add_argument('-q', action='store_true',
+                    help='quiet mode: do not report per-worker throughput.')
+
+    return parser.parse_known_args()
+
+if __name__ == '__main__':
+
+    profiling.start_from_environment()
+
+    args, enrich_args = parse_arguments()
+
+    sys.stdin = fileio.open_input(args.input)
+    sys.stdout = fileio.open_output(args.output)
+
+    enrich_labelset.set_conversions([sys.argv[0]] + enrich_args)
+
+    pool = ParserPool(args.parser, args.jobs, args.retries)
+    lines = parsed_lines(pool, read_chunks(sys.stdin, args.chunk_size))
+
+    if args.no_enrich:
+        for line in lines:
+            sys.stdout.write(line)
+    else:
+        enrich_labelset.main(lines)
+
+    if not args.q:
+        pool.report(sys.stderr)
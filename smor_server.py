@@ -0,0 +1,246 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# morphological analysis server: one or more fst-mor processes with a shared cache of analyses,
+# which are used by all scripts that need SMOR analyses (hybrid_compound_splitter.py, emnlp2015/separable_prefix.py)
+# instead of starting their own fst-mor process.
+#
+# start the server with:
+#
+#   smor_server.py --socket /tmp/smor.sock zmorge-{version}-smor_newlemma.a &
+#
+# and tell the scripts to use it by setting the environment variable SMOR_SERVER:
+#
+#   export SMOR_SERVER=/tmp/smor.sock
+#
+# (hybrid_compound_splitter.py also accepts the socket path with the option -smor-server).
+# the fst-mor processes of the server are restarted according to the options --timeout and --max-restarts of the server;
+# the options -smor-timeout and -smor-restarts of hybrid_compound_splitter.py do not apply in server mode.
+#
+# protocol: the client sends one JSON object per line, e.g. {"command": "analyse", "words": ["Haustür"]},
+# and gets one JSON object per line in return, e.g. {"results": [["Haus<NN>Tür<+NN><Fem><Nom><Sg>", ...]]}.
+# commands: "analyse", "generate" (with a list of words), "info" and "stats".
+
+from __future__ import print_function, unicode_literals
+import sys
+import os
+import json
+import socket
+import signal
+import argparse
+import threading
+from collections import OrderedDict
+
+if sys.version_info >= (3, 0):
+    import socketserver
+    import queue
+else:
+    import SocketServer as socketserver
+    import Queue as queue
+
+from wmt14 import profiling
+
+SMOR_BINARY = 'fst-mor'
+CHILDREN = 1
+CACHE_SIZE = 1000000
+TIMEOUT = 30
+MAX_RESTARTS = 5
+COMMANDS = ['analyse', 'generate']
+
+
+class SmorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """serve SMOR analyses over a Unix socket. Each connection is handled in a separate thread;
+    requests are processed by the first free fst-mor process, and results are cached."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, smor_binary, smor_model, children=CHILDREN, cache_size=CACHE_SIZE,
+                 timeout=TIMEOUT, max_restarts=MAX_RESTARTS):
+
+        # fst_wrapper.py is in the emnlp2015 directory
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'emnlp2015'))
+        import fst_wrapper
+
+        self.smor_model = os.path.abspath(smor_model)
+        self.children = queue.Queue()
+        for i in range(children):
+            self.children.put(fst_wrapper.FstWrapper(smor_binary, smor_model, server='', timeout=timeout, max_restarts=max_restarts))
+
+        # the oldest entries are removed first when the cache is full
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        # requests, words, cache hits
+        self.stats = [0, 0, 0]
+
+        socketserver.UnixStreamServer.__init__(self, socket_path, SmorRequestHandler)
+
+    def process(self, command, words):
+        """return the results of 'command' (analyse or generate) for a list of words"""
+
+        results = [None]*len(words)
+        todo = []
+        with self.lock:
+            self.stats[0] += 1
+            self.stats[1] += len(words)
+            for i, word in enumerate(words):
+                result = self.cache.get((command, word))
+                if result is None:
+                    todo.append(i)
+                else:
+                    results[i] = result
+            self.stats[2] += len(words) - len(todo)
+
+        if todo:
+            child = self.children.get()
+            try:
+                function = getattr(child, command)
+                for i in todo:
+                    results[i] = function(words[i])
+            finally:
+                self.children.put(child)
+
+            with self.lock:
+                for i in todo:
+                    if self.cache_size <= 0:
+                        break
+                    while len(self.cache) >= self.cache_size:
+                        self.cache.popitem(last=False)
+                    self.cache[(command, words[i])] = results[i]
+
+        return results
+
+    def info(self):
+        return {'model': self.smor_model, 'children': self.children.qsize()}
+
+    def get_stats(self):
+        with self.lock:
+            requests, words, hits = self.stats
+            return {'requests': requests, 'words': words, 'cache_hits': hits, 'cache_entries': len(self.cache)}
+
+
+class SmorRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line.decode('UTF-8'))
+                command = request.get('command')
+                if command in COMMANDS:
+                    response = {'results': self.server.process(command, request['words'])}
+                elif command == 'info':
+                    response = self.server.info()
+                elif command == 'stats':
+                    response = self.server.get_stats()
+                else:
+                    response = {'error': 'unknown command: {0}'.format(command)}
+            except Exception as e:
+                response = {'error': '{0}: {1}'.format(type(e).__name__, e)}
+            self.wfile.write((json.dumps(response) + '\n').encode('UTF-8'))
+            self.wfile.flush()
+
+
+class SmorClient(object):
+    """connection to a SmorServer, with the same analyse() and generate() methods as FstWrapper.
+    If smor_model is given, it must be the model that is loaded by the server."""
+
+    def __init__(self, socket_path, smor_model=None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(socket_path)
+        except socket.error as e:
+            raise RuntimeError('cannot connect to SMOR server at {0}: {1}'.format(socket_path, e))
+        self.reader = self.socket.makefile('rb')
+        self.lock = threading.Lock()
+
+        if smor_model is not None:
+            server_model = self.request('info')['model']
+            if server_model != os.path.abspath(smor_model):
+                raise RuntimeError('SMOR server at {0} uses model {1}, not {2}'.format(socket_path, server_model, smor_model))
+
+    def request(self, command, words=None):
+        message = {'command': command}
+        if words is not None:
+            message['words'] = words
+        with self.lock:
+            self.socket.sendall((json.dumps(message) + '\n').encode('UTF-8'))
+            line = self.reader.readline()
+        if not line:
+            raise RuntimeError('connection to SMOR server was closed')
+        response = json.loads(line.decode('UTF-8'))
+        if 'error' in response:
+            raise RuntimeError('SMOR server: {0}'.format(response['error']))
+        return response
+
+    def analyse_batch(self, words):
+        return self.request('analyse', list(words))['results']
+
+    def analyse(self, word):
+        return self.analyse_batch([word])[0]
+
+    def generate_batch(self, words):
+        return self.request('generate', list(words))['results']
+
+    def generate(self, word):
+        return self.generate_batch([word])[0]
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+
+# reported separately with WMT14_PROFILE (see wmt14/profiling.py)
+profiling.register('smor_wait', SmorClient.request)
+
+
+def parse_arguments():
+
+    help_text = "serve SMOR analyses to several processes over a Unix socket, with a shared cache.\n"
+    help_text += "clients find the server through the environment variable SMOR_SERVER (set it to the socket path).\n"
+
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, description=help_text)
+
+    parser.add_argument('model', metavar='SMOR_MODEL',
+                    help='SMOR transducer (e.g. zmorge-{version}-smor_newlemma.a)')
+    parser.add_argument('--socket', required=True, metavar='PATH',
+                    help='path of the Unix socket')
+    parser.add_argument('--children', type=int, default=CHILDREN, metavar='N',
+                    help='number of fst-mor processes (default: %(default)s)')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, metavar='N',
+                    help='maximum number of cached analyses (default: %(default)s)')
+    parser.add_argument('--smor-binary', default=SMOR_BINARY, metavar='PATH',
+                    help='fst-mor binary (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, metavar='SECONDS',
+                    help='maximum time for the analysis of one word; the fst-mor process is then restarted, and the word is quarantined (default: %(default)s). Replaces -smor-timeout of the clients.')
+    parser.add_argument('--max-restarts', type=int, default=MAX_RESTARTS, metavar='N',
+                    help='a fst-mor process gives up if it crashes or hangs this many times in a row (default: %(default)s). Replaces -smor-restarts of the clients.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    profiling.start_from_environment()
+
+    args = parse_arguments()
+
+    if os.path.exists(args.socket):
+        sys.stderr.write('Error: {0} already exists\n'.format(args.socket))
+        sys.exit(1)
+
+    # remove the socket on kill
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = SmorServer(args.socket, args.smor_binary, args.model, args.children, args.cache_size, args.timeout, args.max_restarts)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+        sys.stderr.write('{0}\n'.format(json.dumps(server.get_stats())))
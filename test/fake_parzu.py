@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# stand-in for ParZu in the tests: reads tokenized sentences (one per line) on stdin, and writes a (trivial) parse
+# of each sentence in CoNLL format. The last token is attached to the root as punctuation, the second-to-last token
+# is the full verb, and all other tokens are subjects of the verb.
+#
+# some tokens simulate failures of the parser process; FAKE_PARZU_STATE is a directory for marker files:
+#
+#   CRASHONCE  the process is killed after writing part of its output (only the first time, if FAKE_PARZU_STATE is set)
+#   CRASH      the process is killed every time
+#   HANG       the process writes its pid to FAKE_PARZU_STATE/hang.pid and never finishes
+
+from __future__ import print_function
+import sys
+import os
+import time
+import signal
+
+
+def parse(words):
+    lines = []
+    verb = max(1, len(words) - 1)
+    for i, word in enumerate(words, 1):
+        if i == len(words):
+            tags, head, func = ('$.', '$.'), 0, 'root'
+        elif i == verb:
+            tags, head, func = ('V', 'VVFIN'), 0, 'root'
+        else:
+            tags, head, func = ('N', 'NN'), verb, 'subj'
+        lines.append('\t'.join((str(i), word, word) + tags + ('_', str(head), func, str(head), func)))
+    return '\n'.join(lines) + '\n\n'
+
+
+def die():
+    sys.stdout.flush()
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+if __name__ == '__main__':
+
+    state = os.environ.get('FAKE_PARZU_STATE')
+
+    for line in sys.stdin:
+        words = line.split()
+        if not words:
+            continue
+        if 'CRASHONCE' in words:
+            marker = os.path.join(state, 'crashed') if state else None
+            if marker is None or not os.path.exists(marker):
+                if marker is not None:
+                    open(marker, 'w').close()
+                die()
+        if 'CRASH' in words:
+            die()
+        if 'HANG' in words:
+            with open(os.path.join(state, 'hang.pid'), 'w') as pid_obj:
+                pid_obj.write('{0}\n'.format(os.getpid()))
+            time.sleep(600)
+        sys.stdout.write(parse(words))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# tests of parallel_parzu.py, with test/fake_parzu.py instead of ParZu. Run from the root of the repository:
+#
+#   python -m pytest test   (or: python -m unittest discover test)
+
+from __future__ import unicode_literals
+import sys
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TEST_DIR)
+sys.path.insert(0, ROOT)
+
+import parallel_parzu
+
+FAKE_PARZU = '"{0}" "{1}"'.format(sys.executable, os.path.join(TEST_DIR, 'fake_parzu.py'))
+
+
+def make_input(sentences):
+    """tokenized text with sentences of different lengths, each with a unique first token"""
+    return ''.join('s{0} {1}bellt .\n'.format(i, 'der Hund ' * (i % 4)) for i in range(sentences)).encode('UTF-8')
+
+
+def first_tokens(conll):
+    """return the first token of each sentence in CoNLL output"""
+    return [sentence.split(b'\t')[1] for sentence in conll.split(b'\n\n') if sentence.strip()]
+
+
+class ParallelParzuTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = tempfile.mkdtemp()
+        self.env = dict(os.environ, FAKE_PARZU_STATE=self.state)
+
+    def tearDown(self):
+        shutil.rmtree(self.state)
+
+    def run_script(self, args, data):
+        command = [sys.executable, os.path.join(ROOT, 'parallel_parzu.py'), '--parser', FAKE_PARZU] + args
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.env)
+        output, errors = process.communicate(data)
+        self.assertEqual(process.returncode, 0, errors)
+        return output, errors
+
+    def test_order(self):
+        data = make_input(500)
+        output, errors = self.run_script(['-j', '4', '--chunk-size', '7', '--no-enrich'], data)
+        self.assertEqual(first_tokens(output), [line.split()[0] for line in data.splitlines()])
+
+    def test_retry(self):
+        # the parser process is killed in the middle of the chunk with the sentence 'CRASHONCE'
+        data = make_input(100).replace(b's50 ', b'CRASHONCE ')
+        output, errors = self.run_script(['-j', '3', '--chunk-size', '10', '--no-enrich'], data)
+        self.assertTrue(os.path.exists(os.path.join(self.state, 'crashed')))
+        self.assertIn(b'attempt 1 of 4', errors)
+        self.assertEqual(first_tokens(output), [line.split()[0] for line in data.splitlines()])
+
+    def test_same_as_single_process(self):
+        data = make_input(300)
+        output, errors = self.run_script(['-j', '4', '--chunk-size', '11', '--wmt15'], data)
+
+        pipeline = '{0} | "{1}" "{2}" --wmt15'.format(FAKE_PARZU, sys.executable, os.path.join(ROOT, 'enrich_labelset.py'))
+        process = subprocess.Popen(pipeline, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=self.env)
+        expected = process.communicate(data)[0]
+        self.assertEqual(process.returncode, 0)
+
+        self.assertEqual(output, expected)
+
+    def test_give_up(self):
+        # the first chunk fails every time; the parser process of the second chunk hangs, and must be killed when the pool gives up
+        chunks = [[b'CRASH b .\n'], [b'HANG b .\n'], [b'c d .\n']]
+        pool = parallel_parzu.ParserPool(FAKE_PARZU, 3, 3)
+        old_environ = os.environ.copy()
+        os.environ['FAKE_PARZU_STATE'] = self.state
+        old_stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+        try:
+            start = time.time()
+            self.assertRaises(RuntimeError, list, pool.imap(chunks))
+        finally:
+            sys.stderr.close()
+            sys.stderr = old_stderr
+            os.environ.clear()
+            os.environ.update(old_environ)
+
+        pid_path = os.path.join(self.state, 'hang.pid')
+        while not os.path.exists(pid_path) and time.time() - start < 10:
+            time.sleep(0.1)
+        pid = int(open(pid_path).read())
+        while time.time() - start < 10:
+            try:
+                os.kill(pid, 0)
+            except OSError:
+                break
+            time.sleep(0.1)
+        else:
+            self.fail('hanging parser process {0} was not killed'.format(pid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# tests of tree.CompactTree and tree.CompactForest (emnlp2015/tree.py): same results as tree.Tree, cached leaves,
+# and memory use. Run from the root of the repository:
+#
+#   python -m pytest test   (or: python -m unittest discover test)
+
+from __future__ import unicode_literals
+import sys
+import os
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'emnlp2015'))
+
+import tree
+import separable_prefix_postprocessing
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+TREES = [b'[Q [<s> <s>] [vroot [subj [PPER er]] [VVFIN sagt] [comma [$, ,]] [neb [KOUS dass] [subj [PPER sie]] [avz [PTKVZ an]] [VVFIN kommt]] [punct [$. .]]] [</s> </s>]]',
+         b'[Q [<s> <s>] [vroot [subj [PPER sie]] [VMFIN versucht] [obji [part [PTKZU zu]] [avz [PTKVZ an]] [VVINF kommen]] [punct [$. .]]] [</s> </s>]]',
+         b'[Q [<s> <s>] [vroot [VVFIN kommt] [subj [PPER sie]] [avz [PTKVZ an]] [adv [ADV morgen]] [comma [$, ,]] [neb [KOUS weil] [VVFIN geht]]] [</s> </s>]]']
+
+
+def traced_memory(function):
+    """return the memory (in bytes) allocated by function() that is still in use afterwards, and the result"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+class CompactTreeTest(unittest.TestCase):
+
+    def test_same_as_tree(self):
+        for tree_string in TREES:
+            t = tree.Tree.fast_parse(tree_string)
+            compact = tree.CompactTree.fast_parse(tree_string)
+            self.assertEqual(compact, t)
+            self.assertEqual(compact.leaves(), t.leaves())
+            self.assertEqual(compact.fast_pprint_flat(), t.fast_pprint_flat())
+            for write_tree in False, True:
+                self.assertEqual(separable_prefix_postprocessing.restore_ptkvz(tree_string, write_tree, compact=True),
+                                 separable_prefix_postprocessing.restore_ptkvz(tree_string, write_tree))
+
+        self.assertEqual(separable_prefix_postprocessing.restore_ptkvz(TREES[0], compact=True), b'er sagt , dass sie ankommt .')
+        self.assertEqual(separable_prefix_postprocessing.restore_ptkvz(TREES[1], compact=True), b'sie versucht anzukommen .')
+
+    def test_forest(self):
+        forest = tree.CompactForest(TREES)
+        for index, tree_string in enumerate(TREES):
+            self.assertEqual(forest[index], tree.Tree.fast_parse(tree_string))
+            self.assertEqual(forest.leaves(index), tree.Tree.fast_parse(tree_string).leaves())
+
+    def test_leaf_cache(self):
+        t = tree.CompactTree('[S [NP I] [VP [V saw] [NP him]]]')
+        self.assertEqual(t.leaf_view(), ('I', 'saw', 'him'))
+
+        # modifications of a subtree (through the subtree or through the tree) reach the cache of the tree
+        t[1][1][0] = 'her'
+        self.assertEqual(t.leaves(), ['I', 'saw', 'her'])
+        t[1,1].append('too')
+        self.assertEqual(t.leaf_view(), ('I', 'saw', 'her', 'too'))
+        self.assertEqual(t[1].leaf_view(), ('saw', 'her', 'too'))
+        del t[0]
+        self.assertEqual(t.leaf_view(), ('saw', 'her', 'too'))
+
+        # a Tree subtree is not tracked, so the leaves are not cached
+        t = tree.CompactTree('[S [NP I] [VP [V saw] [NP him]]]')
+        t.leaves()
+        t[1] = tree.Tree('[VP [V saw] [NP him]]')
+        t[1][1][0] = 'her'
+        self.assertEqual(t.leaves(), ['I', 'saw', 'her'])
+
+        # modifications of one tree do not affect the cache of another tree
+        other = tree.CompactTree('[S [NP you]]')
+        leaves = other.leaf_view()
+        t = tree.CompactTree('[S [NP I] [VP [V saw] [NP him]]]')
+        t[1,1,0] = 'her'
+        self.assertIs(other.leaf_view(), leaves)
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc requires Python 3')
+    def test_memory(self):
+        tree_strings = [tree_string.decode('UTF-8') for tree_string in TREES] * 100
+        tree_memory, trees = traced_memory(lambda: [tree.Tree.fast_parse(tree_string) for tree_string in tree_strings])
+        compact_memory, compact_trees = traced_memory(lambda: [tree.CompactTree.fast_parse(tree_string) for tree_string in tree_strings])
+        forest_memory, forest = traced_memory(lambda: tree.CompactForest(tree_strings))
+
+        self.assertEqual(compact_trees, trees)
+        self.assertEqual(list(forest), trees)
+        self.assertLess(compact_memory, tree_memory * 0.75)
+        self.assertLess(forest_memory, compact_memory * 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
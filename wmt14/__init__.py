@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# shared helpers for the scripts of this repository
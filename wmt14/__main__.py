@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# python -m wmt14 SUBCOMMAND [OPTIONS]; see cli.py
+
+from wmt14 import cli
+
+cli.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# content-addressed cache of per-sentence results, for corpora with many duplicate lines (boilerplate, headlines, datelines).
+# results are keyed by a hash of the stage (script), its options, and the input; they are kept in memory with LRU eviction,
+# and optionally in an SQLite database, so that they can be reused across runs:
+#
+#   --cache-size N     number of results kept in memory (default: 100000 if --cache-file is given; otherwise no cache)
+#   --cache-file PATH  SQLite database for results (created if it does not exist)
+#
+# hit-rate statistics are written to standard error at the end.
+
+from __future__ import division, unicode_literals
+import sys
+import hashlib
+from collections import OrderedDict
+
+CACHE_SIZE = 100000
+# number of new results that are written to disk in one transaction
+COMMIT_INTERVAL = 10000
+
+
+class LineCache(object):
+    """bounded LRU cache of results (byte or text strings, of the same type as the input), optionally backed by SQLite"""
+
+    def __init__(self, stage, options='', size=CACHE_SIZE, path=None):
+        self.stage = stage
+        self.prefix = hashlib.sha1('{0}\0{1}\0'.format(stage, options).encode('UTF-8')).digest()
+        self.size = size
+        self.memory = OrderedDict()
+
+        self.path = path
+        self.db = None
+        self.uncommitted = 0
+        if path is not None:
+            import sqlite3
+            self.db = sqlite3.connect(path)
+            self.db.execute('CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value BLOB)')
+            self.binary = sqlite3.Binary
+
+        # lookups, hits (in memory or on disk), hits on disk
+        self.lookups = 0
+        self.hits = 0
+        self.disk_hits = 0
+
+    def key(self, line):
+        if not isinstance(line, bytes):
+            line = line.encode('UTF-8')
+        return hashlib.sha1(self.prefix + line).digest()
+
+    def get(self, line):
+        """return the cached result for line, or None"""
+        self.lookups += 1
+        key = self.key(line)
+
+        value = self.memory.pop(key, None)
+        if value is None and self.db is not None:
+            row = self.db.execute('SELECT value FROM cache WHERE key=?', (self.binary(key),)).fetchone()
+            if row is not None:
+                value = bytes(row[0])
+                if not isinstance(line, bytes):
+                    value = value.decode('UTF-8')
+                self.disk_hits += 1
+        if value is None:
+            return None
+
+        self.hits += 1
+        # most recently used entries are at the end
+        self.memory[key] = value
+        self._evict()
+        return value
+
+    def __contains__(self, line):
+        """check if line is cached, without counting a lookup or changing the order of eviction"""
+        key = self.key(line)
+        if key in self.memory:
+            return True
+        if self.db is not None:
+            return self.db.execute('SELECT 1 FROM cache WHERE key=?', (self.binary(key),)).fetchone() is not None
+        return False
+
+    def lookup_block(self, lines):
+        """return the cached results for a list of lines (None for misses), and the list of distinct lines that were not found.
+        Repetitions of a missing line within the block count as hits, since the line is processed once."""
+        results = [self.get(line) for line in lines]
+        misses = []
+        seen = set()
+        for line, result in zip(lines, results):
+            if result is None:
+                if line in seen:
+                    self.hits += 1
+                else:
+                    seen.add(line)
+                    misses.append(line)
+        return results, misses
+
+    def put(self, line, value):
+        key = self.key(line)
+        self.memory.pop(key, None)
+        self.memory[key] = value
+        self._evict()
+
+        if self.db is not None:
+            if not isinstance(value, bytes):
+                value = value.encode('UTF-8')
+            self.db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?)', (self.binary(key), self.binary(value)))
+            self.uncommitted += 1
+            if self.uncommitted >= COMMIT_INTERVAL:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def _evict(self):
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def apply(self, function, line):
+        """return function(line), from the cache if possible"""
+        value = self.get(line)
+        if value is None:
+            value = function(line)
+            self.put(line, value)
+        return value
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def get_stats(self):
+        return {'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': 100*self.hits/self.lookups if self.lookups else 0,
+                'disk_hits': self.disk_hits,
+                'entries': len(self.memory)}
+
+    def report(self, file_obj=None):
+        # the scripts may have replaced sys.stderr with a binary stream
+        if file_obj is None:
+            file_obj = sys.__stderr__
+        stats = self.get_stats()
+        file_obj.write('cache {0}: {1} lookups, {2} hits ({3:.1f}%), {4} from disk, {5} entries in memory\n'.format(
+            self.stage, stats['lookups'], stats['hits'], stats['hit_rate'], stats['disk_hits'], stats['entries']))
+
+
+def pop_cache_arguments(argv):
+    """remove the options '--cache-size N' and '--cache-file PATH' from a list of command line arguments,
+    and return their values (None if an option is not given)"""
+    values = []
+    for option, value_type in ('--cache-size', int), ('--cache-file', str):
+        value = None
+        if option in argv:
+            i = argv.index(option)
+            value = value_type(argv[i+1])
+            del argv[i:i+2]
+        values.append(value)
+    return tuple(values)
+
+
+def create(stage, options='', size=None, path=None):
+    """return a LineCache, or None if neither a size nor a path is given (or the size is 0)"""
+    if size is None:
+        if path is None:
+            return None
+        size = CACHE_SIZE
+    if size <= 0 and path is None:
+        return None
+    return LineCache(stage, options, size, path)
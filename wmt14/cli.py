@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# single entry point for the scripts of this repository:
+#
+#   python -m wmt14 SUBCOMMAND [OPTIONS]
+#
+# (with the repository directory in PYTHONPATH). Each subcommand runs the corresponding script, with the same options;
+# only the modules that the script needs are imported. With --import-time (before the subcommand),
+# the time spent in imports is written to standard error at exit, so that regressions in start-up time are visible.
+#
+#   python -m wmt14 --import-time split -model MODEL < in > out
+#
+# with --profile, the script is profiled (see profiling.py), and the results are written next to its output.
+
+from __future__ import print_function, unicode_literals
+import sys
+import os
+import time
+import types
+
+if sys.version_info >= (3, 0):
+    import builtins
+else:
+    import __builtin__ as builtins
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# subcommand -> (script, arguments that are inserted before the user's arguments, description)
+SUBCOMMANDS = [
+    ('split', ('hybrid_compound_splitter.py', [], 'compound splitting (hybrid_compound_splitter.py)')),
+    ('train', ('hybrid_compound_splitter.py', ['-train'], 'train a compound splitting model (hybrid_compound_splitter.py -train)')),
+    ('enrich', ('enrich_labelset.py', [], 'modify the label set of ParZu output (enrich_labelset.py)')),
+    ('parse', ('parallel_parzu.py', [], 'parse with several ParZu processes (parallel_parzu.py)')),
+    ('binarize', ('emnlp2015/binarize.py', [], 'binarize trees in Moses XML format (emnlp2015/binarize.py)')),
+    ('unbinarize', ('emnlp2015/unbinarize.py', [], 'remove virtual nodes from bracket trees (emnlp2015/unbinarize.py)')),
+    ('hyphen', ('emnlp2015/hyphen-splitter.py', [], 'split hyphenated words (emnlp2015/hyphen-splitter.py)')),
+    ('ptkvz', ('emnlp2015/separable_prefix.py', [], 'restructure particle verbs (emnlp2015/separable_prefix.py)')),
+    ('ptkvz-post', ('emnlp2015/separable_prefix_postprocessing.py', [], 'restore particle verbs (emnlp2015/separable_prefix_postprocessing.py)')),
+    ('split-restructure', ('emnlp2015/split_and_restructure.py', [], 'compound splitting, hyphen splitting and particle verbs in one process (emnlp2015/split_and_restructure.py)')),
+    ('detruecase', ('emnlp2015/detruecase_ptkvz.py', [], 'post-process decoder tree output (emnlp2015/detruecase_ptkvz.py)')),
+    ('oov-filter', ('emnlp2015/oov_filter.py', [], 'filter a phrase table by vocabulary (emnlp2015/oov_filter.py)')),
+    ('smor-server', ('smor_server.py', [], 'serve SMOR analyses over a Unix socket (smor_server.py)')),
+]
+
+
+class ImportTimer(object):
+    """replacement for __import__ that measures the time spent in each top-level import statement
+    (imports that happen inside another import are included in the time of the outer one)"""
+
+    def __init__(self):
+        self.original = builtins.__import__
+        self.depth = 0
+        self.times = {}
+        self.total = 0
+
+    def __call__(self, name, *args, **kwargs):
+        if self.depth:
+            return self.original(name, *args, **kwargs)
+        self.depth += 1
+        start = time.time()
+        try:
+            return self.original(name, *args, **kwargs)
+        finally:
+            seconds = time.time() - start
+            self.depth -= 1
+            self.times[name] = self.times.get(name, 0) + seconds
+            self.total += seconds
+
+    def install(self):
+        builtins.__import__ = self
+
+    def uninstall(self):
+        builtins.__import__ = self.original
+
+    def report(self, file_obj, subcommand, top=5):
+        slowest = sorted(self.times.items(), key=lambda item: -item[1])[:top]
+        details = ', '.join('{0} {1:.3f}s'.format(name, seconds) for name, seconds in slowest)
+        file_obj.write('wmt14 {0}: {1:.3f}s in imports ({2})\n'.format(subcommand, self.total, details))
+
+
+def usage(file_obj):
+    file_obj.write('usage: python -m wmt14 [--import-time] [--profile] SUBCOMMAND [OPTIONS]\n\nsubcommands:\n')
+    for name, (script, extra_args, description) in SUBCOMMANDS:
+        file_obj.write('  {0:<18} {1}\n'.format(name, description))
+    file_obj.write('\nuse "python -m wmt14 SUBCOMMAND --help" for the options of a subcommand (if the script has a help text).\n')
+
+
+def run(subcommand, args, import_time=False, profile=False):
+    """run the script of a subcommand as __main__, with args as its command line arguments"""
+
+    script, extra_args = dict(SUBCOMMANDS)[subcommand][:2]
+    path = os.path.join(ROOT, script)
+
+    # same environment as if the script was started directly: its directory comes first in the module search path
+    sys.argv = [path] + extra_args + list(args)
+    sys.path[0] = os.path.dirname(path)
+    if ROOT not in sys.path:
+        sys.path.append(ROOT)
+
+    if profile:
+        from wmt14 import profiling
+        profiling.start(os.environ.get(profiling.ENVIRONMENT_VARIABLE))
+
+    timer = ImportTimer()
+    if import_time:
+        timer.install()
+    try:
+        run_script(path)
+    finally:
+        if import_time:
+            timer.uninstall()
+            # the script may have replaced sys.stderr with a binary stream
+            timer.report(sys.__stderr__, subcommand)
+
+
+def run_script(path):
+    """execute a script as the module __main__ (like runpy.run_path, which imports more modules than the script itself)"""
+
+    with open(path, 'rb') as script_file:
+        code = compile(script_file.read(), path, 'exec')
+
+    module = types.ModuleType(str('__main__'))
+    module.__file__ = path
+    module.__builtins__ = builtins
+
+    # multiprocessing finds the functions of the script in sys.modules['__main__']
+    main_module = sys.modules['__main__']
+    sys.modules['__main__'] = module
+    try:
+        exec(code, module.__dict__)
+    finally:
+        sys.modules['__main__'] = main_module
+
+
+def main(argv=None):
+
+    if argv is None:
+        argv = sys.argv[1:]
+
+    import_time = False
+    profile = False
+    while argv and argv[0] in ('--import-time', '--profile'):
+        if argv[0] == '--import-time':
+            import_time = True
+        else:
+            profile = True
+        argv = argv[1:]
+
+    if not argv or argv[0] in ('-h', '--help'):
+        usage(sys.stdout)
+        return
+    if argv[0] not in dict(SUBCOMMANDS):
+        sys.stderr.write('Error: unknown subcommand: {0}\n\n'.format(argv[0]))
+        usage(sys.stderr)
+        sys.exit(1)
+
+    run(argv[0], argv[1:], import_time, profile)
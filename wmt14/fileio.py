@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# transparent compressed input and output for all scripts.
+# compressed input (gzip, xz, zstd) is recognized by its magic bytes, compressed output by the file extension
+# (.gz, .xz, .zst). Decompression and compression run in background threads, so that they overlap with processing.
+# zstd requires the Python module zstandard; xz requires lzma (or backports.lzma in Python 2).
+
+from __future__ import unicode_literals
+import sys
+import io
+import atexit
+import codecs
+import threading
+
+if sys.version_info >= (3, 0):
+    import queue
+else:
+    import Queue as queue
+
+import gzip
+
+from wmt14 import profiling
+
+# imported by get_lzma() and get_zstandard() when needed
+lzma = None
+
+CHUNK_SIZE = 1024*1024
+QUEUE_SIZE = 16
+
+MAGIC = [(b'\x1f\x8b', 'gz'),
+         (b'\xfd7zXZ\x00', 'xz'),
+         (b'\x28\xb5\x2f\xfd', 'zst')]
+
+# id of each stream returned by open_input() -> file descriptor of the (possibly compressed) file, see input_fileno()
+input_filenos = {}
+
+EXTENSIONS = {'.gz': 'gz',
+              '.gzip': 'gz',
+              '.xz': 'xz',
+              '.zst': 'zst',
+              '.zstd': 'zst'}
+
+
+def get_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('zstd compression requires the Python module zstandard')
+    return zstandard
+
+
+def get_lzma():
+    global lzma
+    if lzma is None:
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise RuntimeError('xz compression requires the Python module lzma (backports.lzma in Python 2)')
+    return lzma
+
+
+def detect_compression(stream):
+    """return the compression format of a buffered binary stream (from its first bytes), or None"""
+    start = stream.peek(6)[:6]
+    for magic, compression in MAGIC:
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def compression_from_path(path):
+    """return the compression format implied by the extension of path, or None"""
+    if path is None:
+        return None
+    for extension, compression in EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+class ThreadedReader(io.RawIOBase):
+    """read a (decompressing) stream in a background thread"""
+
+    def __init__(self, stream, close_streams=(), chunk_size=CHUNK_SIZE, queue_size=QUEUE_SIZE):
+        self.stream = stream
+        self.close_streams = close_streams
+        self.queue = queue.Queue(queue_size)
+        self.buffer = b''
+        self.offset = 0
+        self.finished = False
+        self.thread = threading.Thread(target=self._run, args=(chunk_size,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self, chunk_size):
+        try:
+            while True:
+                data = self.stream.read(chunk_size)
+                if not data:
+                    break
+                self.queue.put(data)
+        except Exception as e:
+            self.queue.put(e)
+        self.queue.put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self.offset == len(self.buffer):
+            if self.finished:
+                return 0
+            item = self.queue.get()
+            if item is None:
+                self.finished = True
+                return 0
+            elif isinstance(item, Exception):
+                self.finished = True
+                raise item
+            self.buffer = item
+            self.offset = 0
+        size = min(len(b), len(self.buffer) - self.offset)
+        b[:size] = self.buffer[self.offset:self.offset+size]
+        self.offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            for stream in (self.stream,) + tuple(self.close_streams):
+                stream.close()
+        io.RawIOBase.close(self)
+
+
+class ThreadedWriter(io.RawIOBase):
+    """write to a (compressing) stream in a background thread"""
+
+    def __init__(self, stream, close_streams=(), queue_size=QUEUE_SIZE):
+        self.stream = stream
+        self.close_streams = close_streams
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            # after an error, keep emptying the queue so that the writer does not block
+            if self.error is None:
+                try:
+                    self.stream.write(data)
+                except Exception as e:
+                    self.error = e
+
+    def _check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._check()
+        if isinstance(b, memoryview):
+            data = b.tobytes()
+        else:
+            data = bytes(b)
+        self.queue.put(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.queue.put(None)
+            self.thread.join()
+            for stream in (self.stream,) + tuple(self.close_streams):
+                stream.close()
+            io.RawIOBase.close(self)
+            self._check()
+
+
+def text_reader(stream, encoding):
+    if sys.version_info >= (3, 0):
+        return io.TextIOWrapper(stream, encoding=encoding)
+    else:
+        return codecs.getreader(encoding)(stream)
+
+
+def text_writer(stream, encoding):
+    if sys.version_info >= (3, 0):
+        return io.TextIOWrapper(stream, encoding=encoding)
+    else:
+        return codecs.getwriter(encoding)(stream)
+
+
+def open_input(path=None, encoding=None):
+    """open a file, or standard input if path is None or '-', for reading.
+    Compressed input is decompressed in a background thread (multi-member gzip files are supported).
+    Returns a binary stream, or a text stream if encoding is given."""
+
+    if path is None or path == '-':
+        if sys.version_info >= (3, 0):
+            raw = sys.stdin.buffer
+        else:
+            raw = io.open(sys.stdin.fileno(), 'rb', closefd=False)
+    else:
+        raw = io.open(path, 'rb')
+
+    compression = detect_compression(raw)
+
+    if compression is None:
+        # uncompressed standard input is returned as the scripts used it before
+        if raw is getattr(sys.stdin, 'buffer', None) and encoding is not None:
+            return register_input(profiling.wrap(sys.stdin, 'read'), raw)
+        stream = raw
+    else:
+        if compression == 'gz':
+            decompressed = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif compression == 'xz':
+            decompressed = get_lzma().LZMAFile(raw, 'rb')
+        else:
+            decompressor = get_zstandard().ZstdDecompressor()
+            try:
+                decompressed = decompressor.stream_reader(raw, read_across_frames=True)
+            except TypeError:
+                decompressed = decompressor.stream_reader(raw)
+        stream = io.BufferedReader(ThreadedReader(decompressed, (raw,)), CHUNK_SIZE)
+
+    if encoding is not None:
+        stream = text_reader(stream, encoding)
+    return register_input(profiling.wrap(stream, 'read'), raw)
+
+
+def register_input(stream, raw):
+    try:
+        input_filenos[id(stream)] = raw.fileno()
+    except (AttributeError, IOError, ValueError):
+        pass
+    return stream
+
+
+def input_fileno(stream):
+    """return the file descriptor of the file that is read by a stream returned by open_input(), or None.
+    Its position (os.lseek()) shows how much of the file has been read, also for compressed input."""
+    return input_filenos.get(id(stream))
+
+
+def open_output(path=None, encoding=None, compression=None):
+    """open a file, or standard output if path is None or '-', for writing.
+    Output is compressed in a background thread if compression ('gz', 'xz' or 'zst') is given,
+    or implied by the file extension. The stream is closed at exit.
+    Returns a binary stream, or a text stream if encoding is given."""
+
+    if compression is None:
+        compression = compression_from_path(path)
+
+    profiling.set_output(path)
+
+    if path is None or path == '-':
+        if compression is None:
+            # uncompressed standard output is returned as the scripts used it before
+            if sys.version_info >= (3, 0):
+                stream = sys.stdout if encoding is not None else sys.stdout.buffer
+            else:
+                stream = text_writer(sys.stdout, encoding) if encoding is not None else sys.stdout
+            return profiling.wrap(stream, 'write')
+        if sys.version_info >= (3, 0):
+            raw = sys.stdout.buffer
+        else:
+            raw = io.open(sys.stdout.fileno(), 'wb', closefd=False)
+    else:
+        raw = io.open(path, 'wb')
+
+    if compression is None:
+        stream = raw
+    else:
+        if compression == 'gz':
+            compressed = gzip.GzipFile(fileobj=raw, mode='wb')
+        elif compression == 'xz':
+            compressed = get_lzma().LZMAFile(raw, 'wb')
+        elif compression == 'zst':
+            compressed = get_zstandard().ZstdCompressor().stream_writer(raw)
+        else:
+            raise ValueError('unknown compression: {0}'.format(compression))
+        stream = io.BufferedWriter(ThreadedWriter(compressed, (raw,)), CHUNK_SIZE)
+
+    if encoding is not None:
+        stream = text_writer(stream, encoding)
+
+    stream = profiling.wrap(stream, 'write')
+    atexit.register(stream.close)
+    return stream
+
+
+def pop_io_arguments(argv):
+    """remove the options '--input PATH' and '--output PATH' from a list of command line arguments,
+    and return the two paths (None if an option is not given)"""
+    paths = []
+    for option in '--input', '--output':
+        path = None
+        if option in argv:
+            i = argv.index(option)
+            path = argv[i+1]
+            del argv[i:i+2]
+        paths.append(path)
+    return tuple(paths)
+
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# deferred imports: the scripts start many times per experiment, and heavy modules (lxml, pexpect, multiprocessing)
+# are often not needed for the chosen mode (e.g. training, or plain text instead of trees).
+
+from __future__ import unicode_literals
+import importlib
+
+
+class LazyModule(object):
+    """placeholder for a module that is imported on first attribute access.
+    If several names are given, the first one that can be imported is used."""
+
+    def __init__(self, *names):
+        self._names = names
+
+    def _load(self):
+        error = None
+        for name in self._names:
+            try:
+                module = importlib.import_module(name)
+            except ImportError as e:
+                if error is None:
+                    error = e
+                continue
+            # later lookups find the attributes directly, without going through __getattr__
+            self.__dict__.update(module.__dict__)
+            self.__dict__['_module'] = module
+            return module
+        raise error
+
+    def __getattr__(self, attr):
+        if attr.startswith('__') or attr in ('_names', '_module'):
+            raise AttributeError(attr)
+        return getattr(self._load(), attr)
+
+
+def lazy_import(*names):
+    return LazyModule(*names)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# order-preserving parallel processing for scripts that treat each line (or CoNLL sentence) independently:
+# the input is read in blocks of roughly the same size in bytes (rather than lines, so that a few very long sentences
+# do not stall one worker), blocks are processed by a pool of worker processes, and the results are written
+# in input order. Only a bounded number of blocks is in flight at any time, so memory use does not grow with the input.
+# map_units() also looks up each line in a result cache (cache.py) first, and only sends the misses to the workers.
+
+from __future__ import unicode_literals
+from collections import deque
+
+BLOCK_BYTES = 1024*1024
+
+
+def read_blocks(file_obj, block_bytes=BLOCK_BYTES):
+    """yield lists of lines (or other strings) with a total length of about block_bytes (characters for text streams)"""
+
+    block = []
+    size = 0
+    for line in file_obj:
+        block.append(line)
+        size += len(line)
+        if size >= block_bytes:
+            yield block
+            block = []
+            size = 0
+    if block:
+        yield block
+
+
+def imap_ordered(function, blocks, jobs, initializer=None, initargs=(), max_pending=None):
+    """apply function to each block in a pool of jobs worker processes, and yield the results in the order of the blocks.
+    At most max_pending blocks (default: 2*jobs) are sent to the workers before the oldest result is yielded;
+    results that are finished early wait in this reorder buffer.
+    function must be picklable (a module-level function, or a functools.partial of one)."""
+
+    # multiprocessing is slow to import, and only needed here
+    from multiprocessing import Pool
+
+    if max_pending is None:
+        max_pending = 2*jobs
+
+    pool = Pool(jobs, initializer, initargs)
+    pending = deque()
+    try:
+        for block in blocks:
+            pending.append(pool.apply_async(function, (block,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    except BaseException:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+
+
+def map_units(function, units, jobs=1, block_bytes=BLOCK_BYTES, cache=None, initializer=None, initargs=()):
+    """yield the result for each unit (line, or other independent piece of input) in input order.
+    function maps a list of units to the list of their results; it is applied to blocks of about block_bytes,
+    in jobs worker processes if jobs > 1. If a cache (cache.LineCache) is given, cached results are used,
+    and each distinct unit of a block that is not in the cache is processed once."""
+
+    # blocks (and cached results) that have been sent to function, in input order
+    pending = deque()
+
+    def todo_blocks():
+        for block in read_blocks(units, block_bytes):
+            if cache is None:
+                pending.append((block, None, None))
+                yield block
+                continue
+            results, misses = cache.lookup_block(block)
+            pending.append((block, results, misses))
+            yield misses
+
+    if jobs > 1:
+        outputs = imap_ordered(function, todo_blocks(), jobs, initializer, initargs)
+    else:
+        outputs = (function(block) for block in todo_blocks())
+
+    for output in outputs:
+        block, results, misses = pending.popleft()
+        if results is None:
+            for result in output:
+                yield result
+            continue
+        computed = dict(zip(misses, output))
+        for unit, result in zip(block, results):
+            if result is None:
+                result = computed[unit]
+                cache.put(unit, result)
+            yield result
+
+
+def pop_parallel_arguments(argv):
+    """remove the options '--jobs N' and '--block-bytes N' from a list of command line arguments,
+    and return their values (defaults: 1 and BLOCK_BYTES)"""
+    values = []
+    for option, default in ('--jobs', 1), ('--block-bytes', BLOCK_BYTES):
+        value = default
+        if option in argv:
+            i = argv.index(option)
+            value = int(argv[i+1])
+            del argv[i:i+2]
+        values.append(value)
+    return tuple(values)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# profiling hook for all scripts. If the environment variable WMT14_PROFILE is set (or with "python -m wmt14 --profile SUBCOMMAND"),
+# the script runs under cProfile (from the call of start_from_environment() at the start of its main block),
+# and two files are written at exit:
+#
+#   PREFIX.prof          cProfile dump (e.g. python -m pstats PREFIX.prof)
+#   PREFIX.profile.json  wall-clock time per stage, CPU time, peak memory (tracemalloc; Python 3 only) and maximum RSS
+#
+# PREFIX is the value of WMT14_PROFILE, unless it is 1: then the files are written next to the output of the script
+# (the first file opened with fileio.open_output(), or the file that standard output is redirected to),
+# or to SCRIPT.PID in the working directory.
+#
+# stages: 'read' and 'write' are the times that the script waits for its input and output (measured in fileio),
+# 'setup' is the time before the first input is read. 'parse', 'serialize' and 'smor_wait' (waiting for fst-mor or smor_server.py)
+# are the cumulative times of the functions that the scripts register with register(); 'transform' is the remainder.
+# with --jobs N, only the main process is profiled. Profiling (and tracemalloc in particular) slows down the script.
+
+from __future__ import division, unicode_literals
+import sys
+import os
+import stat
+import time
+import json
+import atexit
+
+ENVIRONMENT_VARIABLE = 'WMT14_PROFILE'
+STAGES = ['setup', 'read', 'parse', 'transform', 'serialize', 'write']
+
+if sys.version_info >= (3, 3):
+    timer = time.perf_counter
+else:
+    timer = time.time
+
+# code of a registered function (filename, line, name, as in pstats) -> stage
+registry = {}
+
+# the active Profiler, or None
+profiler = None
+
+
+def register(stage, *functions):
+    """report the time spent in functions (or methods) as stage when profiling"""
+    for function in functions:
+        code = function.__code__
+        registry[(code.co_filename, code.co_firstlineno, code.co_name)] = stage
+
+
+class Profiler(object):
+
+    def __init__(self, prefix=None):
+        import cProfile
+        self.prefix = prefix
+        self.output = None
+        self.script = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else 'python'
+        self.argv = list(sys.argv)
+        # stage -> [seconds, calls] for the stages measured by TimedStream
+        self.times = {}
+        self.first_read = None
+        self.profile = cProfile.Profile()
+        self.tracemalloc = None
+
+    def start(self):
+        try:
+            import tracemalloc
+            tracemalloc.start()
+            self.tracemalloc = tracemalloc
+        except ImportError:
+            pass
+        self.start_time = timer()
+        self.start_cpu = sum(os.times()[:2])
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.wall = timer() - self.start_time
+        self.cpu = sum(os.times()[:2]) - self.start_cpu
+
+    def add(self, stage, start):
+        """add the time since start to stage"""
+        end = timer()
+        if stage == 'read' and self.first_read is None:
+            self.first_read = start
+        item = self.times.get(stage)
+        if item is None:
+            item = self.times[stage] = [0, 0]
+        item[0] += end - start
+        item[1] += 1
+
+    def get_stats(self):
+        import pstats
+
+        times = dict((stage, 0.0) for stage in STAGES)
+        calls = dict((stage, 0) for stage in STAGES)
+        for stage, (seconds, count) in self.times.items():
+            times[stage] = seconds
+            calls[stage] = count
+
+        for key, (cc, nc, tt, ct, callers) in pstats.Stats(self.profile).stats.items():
+            stage = registry.get(key)
+            if stage is not None:
+                times[stage] = times.get(stage, 0) + ct
+                calls[stage] = calls.get(stage, 0) + nc
+
+        if self.first_read is not None:
+            times['setup'] = self.first_read - self.start_time
+        else:
+            times['setup'] = self.wall
+        times['transform'] = max(0, self.wall - sum(seconds for stage, seconds in times.items() if stage != 'transform'))
+
+        stats = {'script': self.script,
+                 'argv': self.argv,
+                 'pid': os.getpid(),
+                 'python': sys.version.split()[0],
+                 'wall_seconds': self.wall,
+                 'cpu_seconds': self.cpu,
+                 'stages': times,
+                 'calls': calls,
+                 'peak_memory_bytes': None,
+                 'max_rss_bytes': None}
+
+        if self.tracemalloc is not None:
+            stats['peak_memory_bytes'] = self.tracemalloc.get_traced_memory()[1]
+        try:
+            import resource
+            # kilobytes on Linux
+            stats['max_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            pass
+
+        return stats
+
+    def get_prefix(self):
+        if self.prefix and self.prefix != '1':
+            return self.prefix
+        if self.output is not None:
+            return self.output
+        stdout = redirected_stdout()
+        if stdout is not None:
+            return stdout
+        return '{0}.{1}'.format(os.path.splitext(self.script)[0], os.getpid())
+
+    def write(self):
+        prefix = self.get_prefix()
+        stats = self.get_stats()
+        stats['profile'] = prefix + '.prof'
+        self.profile.dump_stats(prefix + '.prof')
+        with open(prefix + '.profile.json', 'w') as out_obj:
+            out_obj.write(json.dumps(stats, indent=2, sort_keys=True) + '\n')
+        return prefix + '.profile.json'
+
+
+class TimedStream(object):
+    """wrapper of a file object that adds the time spent in reading or writing to a stage of the profiler"""
+
+    def __init__(self, stream, stage):
+        self.stream = stream
+        self.stage = stage
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = timer()
+        try:
+            return next(self.stream)
+        finally:
+            profiler.add(self.stage, start)
+
+    next = __next__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, *args):
+        start = timer()
+        try:
+            return self.stream.read(*args)
+        finally:
+            profiler.add(self.stage, start)
+
+    def readline(self, *args):
+        start = timer()
+        try:
+            return self.stream.readline(*args)
+        finally:
+            profiler.add(self.stage, start)
+
+    def write(self, data):
+        start = timer()
+        try:
+            return self.stream.write(data)
+        finally:
+            profiler.add(self.stage, start)
+
+    def flush(self):
+        start = timer()
+        try:
+            return self.stream.flush()
+        finally:
+            profiler.add(self.stage, start)
+
+    def close(self):
+        start = timer()
+        try:
+            return self.stream.close()
+        finally:
+            profiler.add(self.stage, start)
+
+
+def wrap(stream, stage):
+    """return stream, or a TimedStream if profiling is active"""
+    if profiler is None:
+        return stream
+    return TimedStream(stream, stage)
+
+
+def set_output(path):
+    """tell the profiler the path of the output file, next to which the results are written"""
+    if profiler is not None and profiler.output is None and path is not None and path != '-':
+        profiler.output = path
+
+
+def redirected_stdout():
+    """return the path of the file that standard output is redirected to, or None"""
+    try:
+        if stat.S_ISREG(os.fstat(1).st_mode):
+            path = os.readlink('/proc/self/fd/1')
+            if os.path.isfile(path):
+                return path
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def in_worker():
+    """check if this is a worker process of multiprocessing (which is not profiled)"""
+    multiprocessing = sys.modules.get('multiprocessing')
+    return multiprocessing is not None and multiprocessing.current_process().name != 'MainProcess'
+
+
+def start(prefix=None):
+    """start profiling the rest of the program; the results are written at exit"""
+    global profiler
+    if profiler is not None:
+        return
+    profiler = Profiler(prefix)
+    atexit.register(finish)
+    profiler.start()
+
+
+def start_from_environment():
+    """start profiling if the environment variable WMT14_PROFILE is set"""
+    value = os.environ.get(ENVIRONMENT_VARIABLE)
+    if value and value != '0' and not in_worker():
+        start(value)
+
+
+def finish():
+    profiler.stop()
+    path = profiler.write()
+    # the scripts may have replaced sys.stderr with a binary stream
+    sys.__stderr__.write('profile written to {0}\n'.format(path))
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Author: Rico Sennrich
+
+# periodic progress reports for long-running scripts. A background thread writes a status line to standard error
+# every N seconds (or replaces a status file with the status in JSON format), with the number of lines (or sentences)
+# and tokens processed (in tokenized text: the number of spaces, plus one per line), the average and current rate,
+# an ETA if the input is a regular file (also if it is compressed), and statistics of the caches and of fst-mor
+# (latency percentiles of the last analyses):
+#
+#   --progress SECONDS     report every SECONDS seconds
+#   --progress-file PATH   write the status to PATH instead of standard error
+#
+# the main loop only increments two counters; everything else is done by the reporting thread.
+
+from __future__ import division, unicode_literals
+import sys
+import os
+import stat
+import time
+import json
+import threading
+
+INTERVAL = 60
+
+
+class Progress(object):
+
+    def __init__(self, interval=INTERVAL, path=None, unit='lines'):
+        self.interval = interval
+        self.path = path
+        self.unit = unit
+        self.script = os.path.basename(sys.argv[0])
+        self.count = 0
+        self.tokens = 0
+        self.fileno = None
+        # (label, function that returns a dictionary of statistics)
+        self.sources = []
+        self.start_time = time.time()
+        self.last = (self.start_time, 0)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def count_lines(self, lines):
+        """yield lines of tokenized text, and count them and their tokens (the spaces in the line, plus one)"""
+        space = None
+        for line in lines:
+            if space is None:
+                space = b' ' if isinstance(line, bytes) else ' '
+            self.count += 1
+            self.tokens += line.count(space) + 1
+            yield line
+
+    def count_conll(self, lines):
+        """yield the lines of a CoNLL file, and count sentences (empty lines) and tokens (other lines)"""
+        for line in lines:
+            if line.strip():
+                self.tokens += 1
+            else:
+                self.count += 1
+            yield line
+
+    def track_input(self, file_obj):
+        """estimate the remaining time from the position in file_obj (a stream returned by fileio.open_input())"""
+        from wmt14 import fileio
+        self.fileno = fileio.input_fileno(file_obj)
+
+    def add_source(self, label, function):
+        self.sources.append((label, function))
+
+    def start(self):
+        self.start_time = time.time()
+        self.last = (self.start_time, 0)
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        """stop the reporting thread, and write the final status"""
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+        self.report(finished=True)
+
+    def get_position(self):
+        """return the position in the input file and its size in bytes, or None"""
+        if self.fileno is None:
+            return None
+        try:
+            info = os.fstat(self.fileno)
+            if not stat.S_ISREG(info.st_mode) or not info.st_size:
+                return None
+            return os.lseek(self.fileno, 0, os.SEEK_CUR), info.st_size
+        except OSError:
+            return None
+
+    def get_status(self, finished=False):
+        now = time.time()
+        elapsed = now - self.start_time
+        count = self.count
+        last_time, last_count = self.last
+        self.last = (now, count)
+
+        status = {'script': self.script,
+                  'finished': finished,
+                  'elapsed_seconds': elapsed,
+                  self.unit: count,
+                  'tokens': self.tokens,
+                  'rate': count / elapsed if elapsed else 0,
+                  'current_rate': (count - last_count) / (now - last_time) if now > last_time else 0,
+                  'percent': None,
+                  'eta_seconds': None}
+
+        position = self.get_position()
+        # the input is read ahead in blocks; at the end of the file, the position tells nothing about the remaining time
+        if position is not None and not finished and position[0] < position[1]:
+            done, size = position
+            status['percent'] = 100 * done / size
+            if done:
+                status['eta_seconds'] = elapsed * (size - done) / done
+
+        for label, function in self.sources:
+            try:
+                status[label] = function()
+            except RuntimeError:
+                # a container was changed by the main thread while it was read
+                pass
+
+        return status
+
+    def report(self, finished=False):
+        status = self.get_status(finished)
+        if self.path is not None:
+            # replace the status file atomically, so that readers never see a partial file
+            with open(self.path + '.tmp', 'w') as out_obj:
+                out_obj.write(json.dumps(status, sort_keys=True) + '\n')
+            os.rename(self.path + '.tmp', self.path)
+        else:
+            # the scripts may have replaced sys.stderr with a binary stream
+            sys.__stderr__.write(format_status(status, self.unit, [label for label, function in self.sources]) + '\n')
+            sys.__stderr__.flush()
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return '{0}:{1:02d}:{2:02d}'.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return '{0:.1f}'.format(value)
+    return '{0}'.format(value)
+
+
+def format_status(status, unit, labels):
+    line = '{0}: {1} {2}, {3} tokens in {4} ({5:.1f} {2}/s, current {6:.1f} {2}/s)'.format(
+        status['script'], status[unit], unit, status['tokens'], format_duration(status['elapsed_seconds']),
+        status['rate'], status['current_rate'])
+    if status['finished']:
+        line += ', finished'
+    elif status['percent'] is not None:
+        line += ', {0:.1f}% of input'.format(status['percent'])
+        if status['eta_seconds'] is not None:
+            line += ', ETA {0}'.format(format_duration(status['eta_seconds']))
+    for label in labels:
+        if status.get(label):
+            line += '; {0}: {1}'.format(label, ', '.join('{0} {1}'.format(key, format_value(value))
+                                                        for key, value in sorted(status[label].items())))
+    return line
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """return the percentiles of a sequence of durations (in seconds) in milliseconds, e.g. {'latency_p50_ms': 0.2}"""
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return dict(('latency_p{0}_ms'.format(point), 1000*samples[min(len(samples)-1, len(samples)*point//100)]) for point in points)
+
+
+def pop_progress_arguments(argv):
+    """remove the options '--progress SECONDS' and '--progress-file PATH' from a list of command line arguments,
+    and return their values (None if an option is not given)"""
+    values = []
+    for option, value_type in ('--progress', float), ('--progress-file', str):
+        value = None
+        if option in argv:
+            i = argv.index(option)
+            value = value_type(argv[i+1])
+            del argv[i:i+2]
+        values.append(value)
+    return tuple(values)
+
+
+def create(interval=None, path=None, unit='lines'):
+    """return a Progress, or None if neither an interval nor a path is given"""
+    if interval is None:
+        if path is None:
+            return None
+        interval = INTERVAL
+    return Progress(interval, path, unit)